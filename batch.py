@@ -0,0 +1,180 @@
+import json
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import time
+
+import sim
+import verify
+
+# --------------------------------------------------------------------------------
+# BATCH RUNNER
+
+# runs (algorithm, event file) jobs over a pool of worker processes and
+# collects what every run drew (DRAW_PATH / DRAW_TREE output), its message
+# count and wall time into one json summary. with --verify every node's
+# routes are checked afterwards too (verify.py), runs that got any wrong
+# count as 'wrong'.
+
+# the simulator keeps its state in globals (Event_Queue, Topology.this, the
+# dv_table interning), so a job never shares a process: every one gets a
+# freshly spawned process of its own that goes away with it, and is killed if
+# it runs past the timeout. --jobs of them run at once (one per core by
+# default).
+# --------------------------------------------------------------------------------
+
+USAGE_STR = "Usage: python batch.py [EVENT_FILE | DIRECTORY]... (default testing_suite)\n" \
+            "Options: --algorithms=DISTANCE_VECTOR,LINK_STATE (default both)\n" \
+            "         --jobs=N (runs at once, default one per core)\n" \
+            "         --timeout=SECONDS (per run, default 600)\n" \
+            "         --out=FILE (json summary, default batch_summary.json)\n" \
+            "         --verify (check every node's routes afterwards, see verify.py)\n" \
+            "         any sim.py option, applied to every run\n"
+
+ALGORITHMS = ('DISTANCE_VECTOR', 'LINK_STATE')
+OWN_OPTIONS = ('verify', 'algorithms', 'jobs', 'timeout', 'out')
+
+
+# PROCESS POOL -------------------------------------------------------------------
+
+def run_in_child(target, job, conn):
+    try:
+        result = target(*job)
+    except Exception as e:
+        result = {'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+    conn.send(result)
+    conn.close()
+
+
+def run_pool(target, jobs, workers, timeout):
+    # yields (index in jobs, result) as the jobs finish, result is what
+    # target(*job) returned in its own process, or {'status' : 'error' /
+    # 'timeout', ...} if it raised, died or ran out of time. target has to be
+    # a module level function (the child imports it by name)
+    context = multiprocessing.get_context('spawn')
+    waiting = list(enumerate(jobs))[::-1]
+    # {pipe end : (index, process, deadline)}
+    running = {}
+    while waiting or running:
+        while waiting and len(running) < workers:
+            index, job = waiting.pop()
+            reader, writer = context.Pipe(duplex=False)
+            process = context.Process(target=run_in_child, args=(target, job, writer))
+            process.start()
+            writer.close()
+            running[reader] = (index, process, time.monotonic() + timeout)
+
+        next_deadline = min(deadline for index, process, deadline in running.values())
+        ready = multiprocessing.connection.wait(list(running), max(0, next_deadline - time.monotonic()))
+        for reader in ready:
+            index, process, deadline = running.pop(reader)
+            try:
+                result = reader.recv()
+            except EOFError:
+                # died without a result (killed, out of memory...)
+                process.join()
+                result = {'status': 'error', 'error': f"exit code {process.exitcode}"}
+            reader.close()
+            process.join()
+            yield index, result
+
+        now = time.monotonic()
+        for reader, (index, process, deadline) in list(running.items()):
+            if deadline <= now:
+                del running[reader]
+                process.terminate()
+                process.join()
+                reader.close()
+                yield index, {'status': 'timeout'}
+
+
+# JOBS ---------------------------------------------------------------------------
+
+class Draw_Collector(logging.Handler):
+    # keeps every DRAW_PATH / DRAW_TREE line the simulator logs
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.lines = []
+
+    def emit(self, record):
+        message = record.getMessage()
+        if message.startswith('DRAW'):
+            self.lines.append(message)
+
+
+def run_case(algorithm, event_file, options, check=False):
+    # runs in its own process
+    draws = Draw_Collector()
+    logging.basicConfig(level=logging.INFO, handlers=[draws])
+    # "lost connection" and other prints
+    sys.stdout = open(os.devnull, 'w')
+
+    sim.configure(options)
+    start = time.perf_counter()
+    s = sim.Sim(algorithm, event_file)
+    result = {'status': 'ok',
+              'wall_time': round(time.perf_counter() - start, 3),
+              'message_count': s.message_count,
+              'draws': draws.lines}
+    if check:
+        result['verify'] = verify.verify(s.nodes, event_file)
+        if not result['verify']['ok']:
+            result['status'] = 'wrong'
+    return result
+
+
+def event_files(paths):
+    # directories stand for every .event file in them
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.event'))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    options, argv = sim.parse_args(sys.argv)
+    here = os.path.dirname(os.path.abspath(__file__))
+    files = event_files(argv[1:] or [os.path.join(here, 'testing_suite')])
+    algorithms = options.get('algorithms', ','.join(ALGORITHMS)).split(',')
+    workers = options.get('jobs', str(os.cpu_count() or 1))
+    timeout = options.get('timeout', '600')
+    out = options.get('out', 'batch_summary.json')
+    sim_options = {name: value for name, value in options.items() if name not in OWN_OPTIONS}
+
+    if not files or any(a not in ALGORITHMS for a in algorithms) or not workers.isdigit() or int(workers) < 1 \
+            or not timeout.isdigit():
+        sys.stderr.write(USAGE_STR)
+        sys.exit(-1)
+    # a bad sim option exits here with sim.py's usage, not in every run
+    sim.configure(sim_options)
+
+    jobs = [(algorithm, event_file, sim_options, 'verify' in options) for event_file in files for algorithm in algorithms]
+    results = [None] * len(jobs)
+    start = time.perf_counter()
+    for index, result in run_pool(run_case, jobs, int(workers), int(timeout)):
+        algorithm, event_file = jobs[index][:2]
+        results[index] = {'algorithm': algorithm, 'event_file': event_file, **result}
+        print(f"{algorithm:<16} {event_file:<40} {result['status']:<8} {result.get('wall_time', result.get('error', ''))}")
+
+    statuses = [result['status'] for result in results]
+    summary = {'options': sim_options,
+               'jobs': int(workers),
+               'wall_time': round(time.perf_counter() - start, 3),
+               'counts': {status: statuses.count(status) for status in ('ok', 'wrong', 'timeout', 'error')},
+               'results': results}
+    with open(out, 'w') as f:
+        json.dump(summary, f, indent=1)
+
+    print(f"{len(jobs)} runs in {summary['wall_time']} s: {summary['counts']}")
+    if statuses.count('ok') != len(statuses):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import datetime
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import batch
+import sim
+import verify
+
+# --------------------------------------------------------------------------------
+# BENCHMARK HARNESS
+
+# runs sim.Sim on every event file with every algorithm and records, per run:
+# wall_time (seconds), message_count, bytes (sent, as counted by the active
+# codec), convergence_time (simulated time of the last routing message any
+# node handled, nothing changes after it) and peak_rss_kb. with --verify,
+# every node's routes are checked afterwards too (verify.py) and runs that
+# got any wrong are marked 'wrong'.
+
+# every run gets a fresh process of its own (batch.run_pool), one after the
+# other so they never compete for a core.
+
+# each benchmark appends one json line to the output file: the commit it ran
+# on, the options and a result per run, so regressions can be tracked across
+# commits by diffing or plotting the lines
+# --------------------------------------------------------------------------------
+
+USAGE_STR = "Usage: python benchmark.py EVENT_FILE...\n" \
+            "Options: --algorithms=DISTANCE_VECTOR,LINK_STATE (default both)\n" \
+            "         --timeout=SECONDS (per run, default 600)\n" \
+            "         --out=FILE (json lines to append to, default benchmark_results.jsonl)\n" \
+            "         --verify (check every node's routes afterwards, see verify.py)\n" \
+            "         any sim.py option, applied to every run\n"
+
+ALGORITHMS = ('DISTANCE_VECTOR', 'LINK_STATE')
+OWN_OPTIONS = ('verify', 'algorithms', 'timeout', 'out')
+
+
+def run_job(algorithm, event_file, options, check=False):
+    # runs in its own process
+    from distance_vector_node import Distance_Vector_Node
+    from link_state_node import Link_State_Node
+    from simulator.topology import Get_Time
+
+    # DRAW output, dumps and "lost connection" prints are not what we measure
+    logging.basicConfig(level=logging.WARNING)
+    sys.stdout = open(os.devnull, 'w')
+
+    sim.configure(options)
+    node_class = Distance_Vector_Node if algorithm == 'DISTANCE_VECTOR' else Link_State_Node
+    handle = node_class.process_incoming_routing_message
+    last_message = [0]
+
+    def timed(node, m):
+        last_message[0] = Get_Time()
+        return handle(node, m)
+    node_class.process_incoming_routing_message = timed
+
+    start = time.perf_counter()
+    s = sim.Sim(algorithm, event_file)
+    result = {'status': 'ok',
+              'wall_time': round(time.perf_counter() - start, 3),
+              'message_count': s.message_count,
+              'bytes': sum(size for count, size in sim.codec.active.stats.values()),
+              'convergence_time': last_message[0],
+              'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    if check:
+        # after the measurements, it takes time and memory of its own
+        result['verify'] = verify.verify(s.nodes, event_file)
+        if not result['verify']['ok']:
+            result['status'] = 'wrong'
+    return result
+
+
+def git_commit():
+    # (commit hash, uncommitted changes?) of the tree we run from, None if not a git checkout
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=here, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=here, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, status != ''
+
+
+def main():
+    options, argv = sim.parse_args(sys.argv)
+    event_files = argv[1:]
+    algorithms = options.get('algorithms', ','.join(ALGORITHMS)).split(',')
+    timeout = options.get('timeout', '600')
+    out = options.get('out', 'benchmark_results.jsonl')
+    sim_options = {name: value for name, value in options.items() if name not in OWN_OPTIONS}
+
+    if not event_files or any(a not in ALGORITHMS for a in algorithms) or not timeout.isdigit():
+        sys.stderr.write(USAGE_STR)
+        sys.exit(-1)
+    # a bad sim option exits here with sim.py's usage, not in every run
+    sim.configure(sim_options)
+
+    commit, dirty = git_commit()
+    record = {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+              'commit': commit,
+              'dirty': dirty,
+              'python': platform.python_version(),
+              'options': sim_options,
+              'results': []}
+
+    print(f"{'ALGORITHM':<16} {'EVENT FILE':<40} {'STATUS':<8} {'WALL':>9} {'MESSAGES':>10} {'BYTES':>12} {'CONVERGED':>10} {'RSS KB':>9}")
+    jobs = [(algorithm, event_file, sim_options, 'verify' in options) for event_file in event_files for algorithm in algorithms]
+    for index, result in batch.run_pool(run_job, jobs, 1, int(timeout)):
+        algorithm, event_file = jobs[index][:2]
+        result = {'algorithm': algorithm, 'event_file': event_file, **result}
+        record['results'].append(result)
+        if result['status'] in ('ok', 'wrong'):
+            print(f"{algorithm:<16} {event_file:<40} {result['status']:<8} {result['wall_time']:>9} {result['message_count']:>10} "
+                  f"{result['bytes']:>12} {result['convergence_time']:>10} {result['peak_rss_kb']:>9}")
+        else:
+            print(f"{algorithm:<16} {event_file:<40} {result['status']:<8} {result.get('error', '')}")
+
+    with open(out, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+import gzip
+import hashlib
+import heapq
+import itertools
+import pickle
+import sys
+
+import codec
+import dv_table
+import lsdb
+import metrics
+import timers
+from distance_vector_node import Distance_Vector_Node
+from link_state_node import Link_State_Node
+from simulator.event_queue import Event_Queue
+from simulator.topology import Get_Time
+
+# --------------------------------------------------------------------------------
+# CHECKPOINT / WARM START (see --checkpoint and --warm-start in sim.py)
+
+# a checkpoint is the state of a Sim run once everything up to and including
+# simulated time AT has run, end of instant callbacks too: the topology (every
+# node with its LSDB or distance vectors, neighbors and seqs), the routing
+# messages still in flight, pending timers and the module level state nodes
+# share (timers, the shared store of lsdb.py, dv_table.py's node interning,
+# codec and metrics counters). it is a single pickle, so whatever is shared
+# (chunks of Shared_LSDBs, a timer and the node holding it) stays shared,
+# gzipped at level 1 (a fifth of the size, for next to no time).
+
+# a warm start loads it and then reads the event file, leaving out every event
+# at or before AT, they are in the state already. the events after AT may
+# differ from the run that took the checkpoint, so one converged baseline
+# serves any number of experiments. the ones up to AT may not, and neither may
+# the node settings sim.py options make: the checkpoint keeps a digest of
+# those lines and the settings, a warm start refuses a checkpoint that does
+# not match.
+# --------------------------------------------------------------------------------
+
+NODE_CLASSES = (Link_State_Node, Distance_Vector_Node)
+
+# module level state that goes into a checkpoint (timers.order is a counter,
+# it goes in as the next number it would give). lsdb.EMPTY_CHUNK goes in too:
+# it is told apart by identity, so it has to be the very tuple the restored
+# databases and chunks hold
+MODULE_STATE = (
+    (timers, ('end_of_instant', 'timers')),
+    (lsdb, ('shared_node_ids', 'shared_node_index', 'shared_ends', 'shared_adjacency', 'records', 'chunks', 'EMPTY_CHUNK')),
+    (dv_table, ('node_ids', 'node_index')),
+    (codec, ('active',)),
+    (metrics, ('nodes',)),
+)
+
+# set by sim.configure
+# take a checkpoint at simulated time `at` (None for none) and write it to out
+at = None
+out = None
+# the checkpoint to warm start from, None for a cold start
+warm_start = None
+
+# set by load_events
+algorithm = None
+event_file = None
+# {id : event} of the events loaded from the event file (they are not saved,
+# a warm start reads them again), the events are kept so the ids stay theirs
+file_events = {}
+
+
+def settings():
+    # what configure and use_areas set on the node classes, plus the codec
+    ans = {'codec': codec.active.name}
+    for node_class in NODE_CLASSES:
+        ans.update({f"{node_class.__name__}.{name}": value for name, value in vars(node_class).items() if name.isupper()})
+    return ans
+
+
+def digest(event_file, until):
+    # of the event lines at or before until
+    sha = hashlib.sha256()
+    for line in open(event_file):
+        fields = line.split()
+        if fields and fields[0].isdigit() and int(fields[0]) <= until:
+            sha.update(' '.join(fields).encode() + b'\n')
+    return sha.hexdigest()
+
+
+def load_events(sim, algorithm_name, file_name, after=None):
+    # Sim.load_command_file, noting every event it posts and leaving out
+    # those at or before after
+    global algorithm, event_file
+    algorithm, event_file = algorithm_name, file_name
+    post = Event_Queue.Post
+
+    def post_event(e):
+        if after is None or e.time_stamp > after:
+            file_events[id(e)] = e
+            post(e)
+
+    Event_Queue.Post = post_event
+    try:
+        sim.load_command_file(file_name)
+    finally:
+        Event_Queue.Post = post
+
+
+def due(e, timer_due):
+    # whether the checkpoint is to be taken now, before e or the next timer
+    if at is None:
+        return False
+    return min(t for t in (e.time_stamp if e else None, timer_due) if t is not None) > at
+
+
+def save(sim, e):
+    # e : the event just taken off the queue (None if there are no more).
+    # writes the checkpoint and returns the event to go on with
+    global at
+    # e and the events Sim holds (see Sim.hold) stay where they are, they go
+    # before whatever is queued for their time
+    queued = []
+    next_e = Event_Queue.Get_Earliest()
+    while next_e:
+        queued.append(next_e)
+        next_e = Event_Queue.Get_Earliest()
+    held = [held_e for time, order, held_e in sorted(sim.held)]
+    pending = list(heapq.merge([e] if e else [], held, queued, key=lambda event: event.time_stamp))
+
+    order = next(timers.order)
+    timers.order = itertools.count(order)
+    state = {'algorithm': algorithm,
+             'at': at,
+             'time': Get_Time(),
+             'digest': digest(event_file, at),
+             'settings': settings(),
+             'topology': sim.__dict__,
+             'in_flight': [e for e in pending if id(e) not in file_events],
+             'modules': {(module.__name__, name): getattr(module, name) for module, names in MODULE_STATE for name in names},
+             'order': order}
+    with gzip.open(out, 'wb', compresslevel=1) as f:
+        pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+    sim.logging.info("Checkpoint at time %d written to %s" % (at, out))
+
+    # and on with this run as if nothing happened
+    for queued_e in queued:
+        Event_Queue.Post(queued_e)
+    at = None
+    file_events.clear()
+    return e
+
+
+def restore(sim, algorithm_name, file_name):
+    # instead of Sim.load_command_file
+    with gzip.open(warm_start, 'rb') as f:
+        state = pickle.load(f)
+    problem = None
+    if state['algorithm'] != algorithm_name:
+        problem = f"taken with {state['algorithm']}"
+    elif state['settings'] != settings():
+        problem = "taken with other settings: " + ', '.join(
+            f"{name}={value}" for name, value in state['settings'].items() if settings().get(name) != value)
+    elif state['digest'] != digest(file_name, state['at']):
+        problem = f"{file_name} differs from the event file it was taken from up to time {state['at']}"
+    elif at is not None and at <= state['at']:
+        problem = f"taken at time {state['at']}, --checkpoint-at must be later"
+    if problem:
+        sys.stderr.write(f"--warm-start={warm_start}: {problem}\n")
+        sys.exit(-1)
+
+    step = sim.step
+    sim.__dict__.update(state['topology'])
+    sim.step = step
+    # the events held then are in in_flight or the event file
+    sim.held = []
+    for (module_name, name), value in state['modules'].items():
+        setattr(sys.modules[module_name], name, value)
+    timers.order = itertools.count(state['order'])
+    Event_Queue.Current_Time = state['time']
+
+    # the event file first, in flight messages were posted after it
+    load_events(sim, algorithm_name, file_name, state['at'])
+    for e in state['in_flight']:
+        Event_Queue.Post(e)
+    sim.logging.info("Warm start from %s at time %d" % (warm_start, state['at']))
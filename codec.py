@@ -0,0 +1,364 @@
+import json
+import math
+import struct
+
+# --------------------------------------------------------------------------------
+# ROUTING MESSAGE CODECS
+
+# both node classes build and parse every control message through the active
+# codec (codec.active), so the wire format can be swapped without touching the
+# routing logic. decode() always hands back a tuple starting with the kind:
+
+# ('LSA', NODE1, NODE2, SENDER, SEQ, COST)          COST == -1 for a dead link
+# ('DAT', OWNER, SENDER, SEQ, [(NODE1, NODE2, COST, SEQ), ...])
+# ('DSC', SENDER, [(NODE1, NODE2, SEQ), ...])        database summary
+# ('LSR', SENDER, [(NODE1, NODE2), ...])             link state request
+# ('LSU', SENDER, [(NODE1, NODE2, COST, SEQ), ...])  link state update
+# ('LSB', SENDER, [(NODE1, NODE2, COST, SEQ), ...])  batch of LSAs
+# ('SUM', SENDER, [(ORIGIN, DEST, COST, SEQ), ...])  inter-area summaries
+# ('DV', SENDER, SEQ, {DST : [[PATH], COST, LEARNED_FROM]})
+# ('DVD', SENDER, SEQ, {DST : [[PATH], COST, LEARNED_FROM]}, [WITHDRAWN_DST, ...])
+# ('DVR', SENDER)                                    full vector refresh request
+
+# every codec also counts what goes out: stats = {kind : [messages, bytes]},
+# kind(m) is the kind of an encoded message without decoding it
+# --------------------------------------------------------------------------------
+
+TEXT_KINDS = ('LSA', 'DAT', 'DSC', 'LSR', 'LSU', 'LSB', 'SUM', 'DVD', 'DVR')
+
+
+class Text_Codec:
+    # the original pipe delimited / json text format
+    # "LSA|NODE1|NODE2|MESSAGE_SENDER|SEQ_NUM|LINK_COST"
+    # "DAT|OWNER|SENDER|SEQ|JSON_DUMP_OF_LINK_SEQS|JSON_DUMP_OF_LINK_COSTS"
+    # "DSC|SENDER|JSON_DUMP_OF_[NODE1, NODE2, SEQ]_LIST"
+    # "LSR|SENDER|JSON_DUMP_OF_[NODE1, NODE2]_LIST"
+    # "LSU|SENDER|JSON_DUMP_OF_[NODE1, NODE2, COST, SEQ]_LIST"
+    # "LSB|SENDER|JSON_DUMP_OF_[NODE1, NODE2, COST, SEQ]_LIST"
+    # "SUM|SENDER|JSON_DUMP_OF_[ORIGIN, DEST, COST, SEQ]_LIST"
+    # "SENDER|SEQ|JSON_DUMP_OF_DISTANCE_VECTOR"
+    # "DVD|SENDER|SEQ|JSON_DUMP_OF_CHANGED_ENTRIES|JSON_DUMP_OF_WITHDRAWN_DSTS"
+    # "DVR|SENDER"
+    name = 'TEXT'
+
+    def __init__(self):
+        self.stats = {}
+
+    def kind(self, m):
+        kind = m[0:3]
+        return kind if kind in TEXT_KINDS else 'DV'
+
+    def record(self, m):
+        entry = self.stats.setdefault(self.kind(m), [0, 0])
+        entry[0] += 1
+        entry[1] += len(m)
+
+    def encode_lsa(self, node1, node2, sender, seq, cost):
+        return f"LSA|{node1}|{node2}|{sender}|{seq}|{cost}"
+
+    def encode_dat(self, owner, sender, seq, links):
+        # credit : the link list (de)serialization was originally created by chatgpt
+        links = list(links)
+        json_seqs = json.dumps([[[node1, node2], link_seq] for node1, node2, cost, link_seq in links])
+        json_costs = json.dumps([[[node1, node2], cost] for node1, node2, cost, link_seq in links])
+        return f"DAT|{owner}|{sender}|{seq}|{json_seqs}|{json_costs}"
+
+    def encode_dsc(self, sender, digest):
+        return f"DSC|{sender}|" + json.dumps(digest)
+
+    def encode_lsr(self, sender, wanted):
+        return f"LSR|{sender}|" + json.dumps(wanted)
+
+    def encode_lsu(self, sender, links):
+        return f"LSU|{sender}|" + json.dumps(links)
+
+    def encode_lsb(self, sender, links):
+        return f"LSB|{sender}|" + json.dumps(links)
+
+    def encode_sum(self, sender, records):
+        return f"SUM|{sender}|" + json.dumps(records)
+
+    def encode_dv(self, sender, seq, vector):
+        return f"{sender}|{seq}|" + json.dumps(vector)
+
+    def encode_dv_delta(self, sender, seq, vector, withdrawn):
+        return f"DVD|{sender}|{seq}|{json.dumps(vector)}|{json.dumps(withdrawn)}"
+
+    def encode_dv_refresh(self, sender):
+        return f"DVR|{sender}"
+
+    def decode(self, m):
+        kind = m[0:3]
+        if kind == 'LSA':
+            parts = m[4:].split('|')
+            return ('LSA', int(parts[0]), int(parts[1]), int(parts[2]), int(parts[3]), int(parts[4]))
+
+        if kind == 'DAT':
+            parts = m[4:].split('|')
+            seqs = json.loads(parts[3])
+            costs = json.loads(parts[4])
+            links = [(link[0], link[1], cost, link_seq) for (link, link_seq), (_, cost) in zip(seqs, costs)]
+            return ('DAT', int(parts[0]), int(parts[1]), int(parts[2]), links)
+
+        def int_keys_hook(d):
+            return {int(k): v for k, v in d.items()}
+
+        if kind == 'DVD':
+            parts = m[4:].split('|')
+            return ('DVD', int(parts[0]), int(parts[1]), json.loads(parts[2], object_hook=int_keys_hook), json.loads(parts[3]))
+
+        if kind == 'DVR':
+            return ('DVR', int(m[4:]))
+
+        if kind in TEXT_KINDS:
+            # DSC / LSR / LSU / LSB / SUM all carry a sender and a json list of entries
+            sender, entries = m[4:].split('|', 1)
+            return (kind, int(sender), [tuple(entry) for entry in json.loads(entries)])
+
+        if '|' not in m:
+            # not a real dva
+            return (None,)
+        parts = m.split('|', 2)
+
+        return ('DV', int(parts[0]), int(parts[1]), json.loads(parts[2], object_hook=int_keys_hook))
+
+
+# --------------------------------------------------------------------------------
+# BINARY STRUCTURE:
+
+# every message starts with a struct packed header (just the type byte for a
+# single LSA, type + entry count otherwise), the rest is varints
+# (LEB128, zigzag for values that can be negative)
+
+# LSA : TYPE(LSA)          NODE1 NODE2 SENDER SEQ zz(COST)
+# DAT : HEADER(DAT, LINKS) OWNER SENDER SEQ then per link: NODE1 NODE2 SEQ zz(COST)
+# DSC : HEADER(DSC, LINKS) SENDER then per link: NODE1 NODE2 SEQ
+# LSR : HEADER(LSR, LINKS) SENDER then per link: NODE1 NODE2
+# LSU : HEADER(LSU, LINKS) SENDER then per link: NODE1 NODE2 SEQ zz(COST)
+# LSB : HEADER(LSB, LINKS) SENDER then per link: NODE1 NODE2 SEQ zz(COST)
+# SUM : HEADER(SUM, RECORDS) SENDER then per record: ORIGIN DEST SEQ zz(COST)
+# DV  : HEADER(DV, DSTS)   SENDER SEQ then per dst: DST COST+1 zz(LEARNED_FROM)
+#                          PATH_LEN PATH...          (COST+1 == 0 means inf)
+# DVD : HEADER(DVD, DSTS)  SENDER SEQ WITHDRAWN_COUNT WITHDRAWN... then per dst
+#                          as in DV
+# DVR : HEADER(DVR, 0)     SENDER
+# --------------------------------------------------------------------------------
+
+LSA_TYPE = 1
+DAT_TYPE = 2
+DV_TYPE = 3
+DSC_TYPE = 4
+LSR_TYPE = 5
+LSU_TYPE = 6
+LSB_TYPE = 7
+DVD_TYPE = 8
+DVR_TYPE = 9
+SUM_TYPE = 10
+
+TYPE = struct.Struct('!B')
+HEADER = struct.Struct('!BI')
+TYPE_NAMES = {LSA_TYPE: 'LSA', DAT_TYPE: 'DAT', DV_TYPE: 'DV', DSC_TYPE: 'DSC', LSR_TYPE: 'LSR', LSU_TYPE: 'LSU', LSB_TYPE: 'LSB',
+              DVD_TYPE: 'DVD', DVR_TYPE: 'DVR', SUM_TYPE: 'SUM'}
+
+
+def put_varint(buf, value):
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def put_signed(buf, value):
+    put_varint(buf, (value << 1) if value >= 0 else ((-value << 1) - 1))
+
+
+def read_varints(view):
+    # decodes every varint in the memoryview in one pass over its bytes
+    # (iterating a memoryview yields ints, nothing is copied)
+    values = []
+    value = 0
+    shift = 0
+    for byte in view:
+        if byte < 0x80:
+            values.append(value | (byte << shift))
+            value = 0
+            shift = 0
+        else:
+            value |= (byte & 0x7f) << shift
+            shift += 7
+    return values
+
+
+def unzigzag(value):
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+
+class Binary_Codec:
+    name = 'BINARY'
+
+    def __init__(self):
+        self.stats = {}
+
+    def kind(self, m):
+        return TYPE_NAMES.get(m[0])
+
+    def record(self, m):
+        entry = self.stats.setdefault(self.kind(m), [0, 0])
+        entry[0] += 1
+        entry[1] += len(m)
+
+    def encode_lsa(self, node1, node2, sender, seq, cost):
+        buf = bytearray(TYPE.pack(LSA_TYPE))
+        put_varint(buf, node1)
+        put_varint(buf, node2)
+        put_varint(buf, sender)
+        put_varint(buf, seq)
+        put_signed(buf, cost)
+        return bytes(buf)
+
+    def encode_dat(self, owner, sender, seq, links):
+        links = list(links)
+        buf = bytearray(HEADER.pack(DAT_TYPE, len(links)))
+        put_varint(buf, owner)
+        put_varint(buf, sender)
+        put_varint(buf, seq)
+        for node1, node2, cost, link_seq in links:
+            put_varint(buf, node1)
+            put_varint(buf, node2)
+            put_varint(buf, link_seq)
+            put_signed(buf, cost)
+        return bytes(buf)
+
+    def encode_dsc(self, sender, digest):
+        buf = bytearray(HEADER.pack(DSC_TYPE, len(digest)))
+        put_varint(buf, sender)
+        for node1, node2, link_seq in digest:
+            put_varint(buf, node1)
+            put_varint(buf, node2)
+            put_varint(buf, link_seq)
+        return bytes(buf)
+
+    def encode_lsr(self, sender, wanted):
+        buf = bytearray(HEADER.pack(LSR_TYPE, len(wanted)))
+        put_varint(buf, sender)
+        for node1, node2 in wanted:
+            put_varint(buf, node1)
+            put_varint(buf, node2)
+        return bytes(buf)
+
+    def encode_lsu(self, sender, links):
+        return self.encode_links(LSU_TYPE, sender, links)
+
+    def encode_lsb(self, sender, links):
+        return self.encode_links(LSB_TYPE, sender, links)
+
+    def encode_sum(self, sender, records):
+        # (ORIGIN, DEST, COST, SEQ) packs just like a link
+        return self.encode_links(SUM_TYPE, sender, records)
+
+    def encode_links(self, kind, sender, links):
+        buf = bytearray(HEADER.pack(kind, len(links)))
+        put_varint(buf, sender)
+        for node1, node2, cost, link_seq in links:
+            put_varint(buf, node1)
+            put_varint(buf, node2)
+            put_varint(buf, link_seq)
+            put_signed(buf, cost)
+        return bytes(buf)
+
+    def encode_dv(self, sender, seq, vector):
+        buf = bytearray(HEADER.pack(DV_TYPE, len(vector)))
+        put_varint(buf, sender)
+        put_varint(buf, seq)
+        self.put_vector(buf, vector)
+        return bytes(buf)
+
+    def encode_dv_delta(self, sender, seq, vector, withdrawn):
+        buf = bytearray(HEADER.pack(DVD_TYPE, len(vector)))
+        put_varint(buf, sender)
+        put_varint(buf, seq)
+        put_varint(buf, len(withdrawn))
+        for dst in withdrawn:
+            put_varint(buf, dst)
+        self.put_vector(buf, vector)
+        return bytes(buf)
+
+    def encode_dv_refresh(self, sender):
+        buf = bytearray(HEADER.pack(DVR_TYPE, 0))
+        put_varint(buf, sender)
+        return bytes(buf)
+
+    def put_vector(self, buf, vector):
+        for dst, (path, cost, learned_from) in vector.items():
+            put_varint(buf, dst)
+            put_varint(buf, 0 if cost == math.inf else cost + 1)
+            put_signed(buf, learned_from)
+            put_varint(buf, len(path))
+            for node in path:
+                put_varint(buf, node)
+
+    def read_vector(self, values, i, count):
+        # the per dst part of DV / DVD starting at values[i]
+        vector = {}
+        for _ in range(count):
+            cost = values[i + 1]
+            length = values[i + 3]
+            vector[values[i]] = [values[i + 4:i + 4 + length], math.inf if cost == 0 else cost - 1, unzigzag(values[i + 2])]
+            i += 4 + length
+        return vector
+
+    def decode(self, m):
+        view = memoryview(m)
+        kind, = TYPE.unpack_from(view, 0)
+
+        if kind == LSA_TYPE:
+            node1, node2, sender, seq, cost = read_varints(view[TYPE.size:])
+            return ('LSA', node1, node2, sender, seq, unzigzag(cost))
+
+        kind, count = HEADER.unpack_from(view, 0)
+        values = read_varints(view[HEADER.size:])
+
+        if kind == DAT_TYPE:
+            owner, sender, seq = values[0:3]
+            links = []
+            for i in range(3, 3 + 4 * count, 4):
+                links.append((values[i], values[i + 1], unzigzag(values[i + 3]), values[i + 2]))
+            return ('DAT', owner, sender, seq, links)
+
+        if kind == DSC_TYPE:
+            digest = [(values[i], values[i + 1], values[i + 2]) for i in range(1, 1 + 3 * count, 3)]
+            return ('DSC', values[0], digest)
+
+        if kind == LSR_TYPE:
+            wanted = [(values[i], values[i + 1]) for i in range(1, 1 + 2 * count, 2)]
+            return ('LSR', values[0], wanted)
+
+        if kind == LSU_TYPE or kind == LSB_TYPE or kind == SUM_TYPE:
+            links = [(values[i], values[i + 1], unzigzag(values[i + 3]), values[i + 2]) for i in range(1, 1 + 4 * count, 4)]
+            return (TYPE_NAMES[kind], values[0], links)
+
+        if kind == DV_TYPE:
+            sender, seq = values[0:2]
+            return ('DV', sender, seq, self.read_vector(values, 2, count))
+
+        if kind == DVD_TYPE:
+            sender, seq, withdrawn_count = values[0:3]
+            withdrawn = values[3:3 + withdrawn_count]
+            return ('DVD', sender, seq, self.read_vector(values, 3 + withdrawn_count, count), withdrawn)
+
+        if kind == DVR_TYPE:
+            return ('DVR', values[0])
+
+        return (None,)
+
+
+CODECS = {'TEXT': Text_Codec, 'BINARY': Binary_Codec}
+
+# the codec every node encodes with, swap it with use()
+active = Text_Codec()
+
+
+def use(name):
+    global active
+    active = CODECS[name]()
+    return active
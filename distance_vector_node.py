@@ -1,13 +1,52 @@
 import copy
 from simulator.node import Node
-import json
+import codec
+import dv_engine
+import dv_table
 import math
+import timers
 # ---------------------------------------------------
 # ROUTING MESSAGE STRUCTURE
-# "SENDER|SEQ|[DISTANCE_VECTOR]" 
+# (SENDER, SEQ, {DISTANCE_VECTOR})
+# with DELTA_UPDATES also:
+# DVD : (SENDER, SEQ, {CHANGED_ENTRIES}, [WITHDRAWN_DSTS])
+# DVR : (SENDER)  please send me your full vector
+# put on the wire by the active codec (see codec.py)
 # ---------------------------------------------------
 
 class Distance_Vector_Node(Node):    
+    # only re-evaluate the destinations an event can have affected instead of
+    # rebuilding the whole dv from every neighbor's vector
+    INCREMENTAL_DV = True
+    # after every incremental update, also rebuild from scratch and compare
+    # (falls back to the full result if they disagree)
+    VERIFY_DV = False
+    # keep the dv and every neighbor's vector in dv_table.DV_Table columns,
+    # with bitset paths instead of path lists
+    COMPACT_DV = False
+    # after a change, send neighbors only the entries that changed instead of
+    # the whole vector (and nothing to one that would drop them all). full
+    # vectors only go to new neighbors and to neighbors that noticed a gap in
+    # our seq
+    DELTA_UPDATES = True
+    # keep neighbors' vectors as rows of a numpy cost matrix as well and pick
+    # routes to non-neighbors with one broadcast add + argmin (dv_engine.py)
+    NUMPY_DV = False
+    # simulated time to hold changes back for before advertising them all
+    # together, 0 advertises every change right away. link failures are
+    # always advertised right away (along with whatever was held back)
+    PACING_INTERVAL = 0
+    # routes that cost this much or more count as unreachable. a finite cap
+    # bounds how long bad news can take to go around (cost only grows)
+    INFINITY = math.inf
+    # full floods tell the neighbor we route through that we can't get there
+    # (INFINITY) instead of leaving the entry out. deltas go to every
+    # neighbor alike, there the receiver drops whatever it was learned from
+    # (see apply_delta)
+    POISON_REVERSE = True
+    # losing a route altogether is advertised right away even when pacing,
+    # and full floods name the lost destinations (INFINITY) once
+    FAST_WITHDRAWAL = True
 
     def __init__(self, id):
         super().__init__(id)
@@ -19,7 +58,12 @@ class Distance_Vector_Node(Node):
         # node1.dv[node2][1] == latency of that path
         # node1.dv[node2][2] == learned_from, the node where node1 learned
         # this path, this is stored for implementation of split horizons
-        self.dv = {self.id : [self.id, 0, -1]}
+        # (a dv_table.DV_Table with bitset paths if COMPACT_DV, same interface)
+        if self.COMPACT_DV:
+            self.dv = dv_table.DV_Table()
+            self.dv[self.id] = [self.path_to(self.id), 0, -1]
+        else:
+            self.dv = {self.id : [self.id, 0, -1]}
         
         # NEIGHBORS DICT STRUCTURE:
         # {neighbor : [most_recent_dv, seq, latency]}
@@ -30,6 +74,28 @@ class Distance_Vector_Node(Node):
         
         # seq num starts at 1, save new neighbors w seq = 0
         self.seq = 1
+        # with DELTA_UPDATES seqs are per neighbor instead (see next_seq)
+        # sent_seqs : {neighbor : seq_of_last_message_sent_to_it}
+        # flooded_from : {dst : learned_from_of_the_entry_last_flooded}
+        # refreshed : neighbors sent a full vector since the last delta flood
+        self.sent_seqs = {}
+        self.flooded_from = {}
+        self.refreshed = set()
+
+        # neighbors we asked for a full vector and haven't heard back from
+        self.refresh_pending = set()
+
+        self.engine = dv_engine.DV_Engine(self) if self.NUMPY_DV else None
+
+        # COMPACT_DV: our neighbors as a path bitset, for loop_free
+        self.neighbor_bits = 0
+
+        # what pacing is holding back: changed destinations (None if a full
+        # flood is owed) and new neighbors owed a full vector, while
+        # flood_timer (the end of the interval) is set
+        self.flood_timer = None
+        self.held_changes = set()
+        self.held_neighbors = []
 
     def __str__(self):
         # return f"NODE ID: {self.id}\nNEIGHBORS: {self.neighbors}\nSEQ: {self.seq}\nDV: {self.dv}"
@@ -40,58 +106,191 @@ class Distance_Vector_Node(Node):
         retstr += "\nPATHS:\n"
 
         for d in self.dv:
-            retstr += f"{d} : {self.dv[d][0]} : {self.dv[d][1]}\n"
+            if self.COMPACT_DV:
+                # no path order to show, just who is on it and the first hop
+                retstr += f"{d} : via {self.get_next_hop(d)} {dv_table.path_nodes(self.dv[d][0])} : {self.dv[d][1]}\n"
+            else:
+                retstr += f"{d} : {self.dv[d][0]} : {self.dv[d][1]}\n"
 
         retstr += "----------------------------------"
         return retstr
 
 
-    def responsible_flood(self):
+    def send_to_neighbor(self, neighbor, m):
+        codec.active.record(m)
+        super().send_to_neighbor(neighbor, m)
+
+    def responsible_flood(self, changed=None, new_neighbor=None, urgent=False):
+        # changed : destinations whose entry changed since the last flood
+        # new_neighbor : a neighbor that has never seen our vector
+        # urgent : goes out right away even when pacing
+        if self.PACING_INTERVAL:
+            self.hold_flood(changed, new_neighbor)
+            if urgent:
+                self.release_flood()
+            return
+        self.send_flood(changed, [] if new_neighbor is None else [new_neighbor])
+
+    def hold_flood(self, changed, new_neighbor):
+        if changed is None or self.held_changes is None:
+            self.held_changes = None
+        else:
+            self.held_changes.update(changed)
+        if new_neighbor is not None and new_neighbor not in self.held_neighbors:
+            self.held_neighbors.append(new_neighbor)
+        if self.flood_timer is None:
+            self.flood_timer = timers.after(self.PACING_INTERVAL, self.release_flood)
+
+    def release_flood(self):
+        # one advertisement for everything held back
+        if self.flood_timer is not None:
+            timers.cancel(self.flood_timer)
+            self.flood_timer = None
+        changed, self.held_changes = self.held_changes, set()
+        new_neighbors = [n for n in self.held_neighbors if n in self.neighbors]
+        self.held_neighbors = []
+        self.send_flood(changed, new_neighbors)
+
+    def send_flood(self, changed, new_neighbors):
+        if self.DELTA_UPDATES and changed is not None:
+            self.flood_delta(changed, new_neighbors)
+            return
+
         # send out dv ONLY including nodes not learned from node we send to
+        # (or, with POISON_REVERSE, telling it we can't get there)
+        if self.COMPACT_DV:
+            # turning bitsets back into node lists is the expensive part, do
+            # it once for every neighbor
+            full_vector = self.dv.to_wire()
+
+        withdrawn = {}
+        if self.FAST_WITHDRAWAL and changed:
+            for dst in changed:
+                if dst not in self.dv:
+                    withdrawn[dst] = [[dst], self.INFINITY, -1]
+
         for n in self.neighbors:
-            dv_to_transmit = {}
-            for node in self.dv:
-                if self.dv[node][2] != n:
-                    # if we did not learn this path from n, we can share
-                    dv_to_transmit[node] = self.dv[node]
-            
+            if self.COMPACT_DV:
+                dv_to_transmit = {dst: entry for dst, entry in full_vector.items() if entry[2] != n}
+                if self.POISON_REVERSE:
+                    for dst, entry in full_vector.items():
+                        if entry[2] == n:
+                            dv_to_transmit[dst] = [entry[0], self.INFINITY, n]
+            else:
+                dv_to_transmit = {}
+                for node in self.dv:
+                    if self.dv[node][2] != n:
+                        # if we did not learn this path from n, we can share
+                        dv_to_transmit[node] = self.dv[node]
+                    elif self.POISON_REVERSE:
+                        dv_to_transmit[node] = [self.dv[node][0], self.INFINITY, n]
+            dv_to_transmit.update(withdrawn)
+            if self.DELTA_UPDATES:
+                self.refreshed.add(n)
+
             if dv_to_transmit != {}:
-                dva = f"{self.id}|{self.seq}|" + json.dumps(dv_to_transmit)
+                dva = codec.active.encode_dv(self.id, self.next_seq(n), dv_to_transmit)
                 self.send_to_neighbor(n, dva)
         
         self.seq += 1
 
+    def next_seq(self, neighbor):
+        # the seq of the next message to neighbor. with DELTA_UPDATES each
+        # neighbor gets a run of its own, so one left out of a delta flood
+        # sees no gap (see apply_delta)
+        if not self.DELTA_UPDATES:
+            return self.seq
+        self.sent_seqs[neighbor] = self.sent_seqs.get(neighbor, 0) + 1
+        return self.sent_seqs[neighbor]
+
+    def flood_delta(self, changed, new_neighbors=()):
+        # split horizon is up to the receiver here (it drops the entries we
+        # learned from it), so every neighbor gets the very same entries. if
+        # the old and the new entries were all learned from one neighbor, it
+        # would drop every one of them and held none before, so it is left
+        # out (unless a full vector it got since holds some of them)
+        if changed:
+            entries = {}
+            withdrawn = []
+            learned = set()
+            for dst in changed:
+                if dst in self.flooded_from:
+                    learned.add(self.flooded_from.pop(dst))
+                entry = self.dv.get(dst)
+                if entry is None:
+                    withdrawn.append(dst)
+                    continue
+                learned.add(entry[2])
+                self.flooded_from[dst] = entry[2]
+                if self.COMPACT_DV:
+                    entries[dst] = [dv_table.path_nodes(entry[0]), entry[1], entry[2]]
+                else:
+                    entries[dst] = entry
+            skipped = learned.pop() if len(learned) == 1 else None
+
+            # neighbors are on their own seqs, those on the same one share
+            # the message
+            messages = {}
+            for n in self.neighbors:
+                if n in new_neighbors or (n == skipped and n not in self.refreshed):
+                    continue
+                seq = self.next_seq(n)
+                if seq not in messages:
+                    messages[seq] = codec.active.encode_dv_delta(self.id, seq, entries, withdrawn)
+                self.send_to_neighbor(n, messages[seq])
+            self.refreshed.clear()
+
+        for n in new_neighbors:
+            self.send_full_vector(n)
+
+    def send_full_vector(self, neighbor):
+        # the whole vector as it is now
+        vector = self.dv.to_wire() if self.COMPACT_DV else self.dv
+        self.send_to_neighbor(neighbor, codec.active.encode_dv(self.id, self.next_seq(neighbor), vector))
+
     def link_has_been_updated(self, neighbor, latency):
         
         if neighbor not in self.neighbors and latency != -1:
             # case 1: brand new neighbor/link
             # give neighbor a stored seq of 0
             # default DV of empty dict, learned from -1
-            self.neighbors[neighbor] = [{}, 0, latency]
-            self.dv[neighbor] = [[neighbor], latency, neighbor]
-            self.recompute_own_dv()
+            self.neighbors[neighbor] = [dv_table.DV_Table() if self.COMPACT_DV else {}, 0, latency]
+            self.refresh_pending.discard(neighbor)
+            if self.COMPACT_DV:
+                self.neighbor_bits |= dv_table.node_bit(neighbor)
+            if self.engine is not None:
+                self.engine.reset()
+            changed = self.recompute_own_dv()
             # there was definitely a change
-            self.responsible_flood()
+            self.responsible_flood(changed, new_neighbor=neighbor)
         
         elif neighbor in self.neighbors and latency != -1:
             # case 2: neighbor exists, but a change in latency
             old_lat = self.dv[neighbor][1]
             if old_lat != latency:
-                self.dv[neighbor][1] = latency
                 self.neighbors[neighbor][2] = latency
-                self.recompute_own_dv()
+                if self.INCREMENTAL_DV:
+                    # the neighbor set is unchanged, our route to neighbor
+                    # (and whatever goes through it) is redone in there
+                    changed = self.update_own_dv({neighbor})
+                else:
+                    changed = self.recompute_own_dv()
                 # a change has definitely taken place
                 
-                self.responsible_flood()
+                self.responsible_flood(changed)
         else:
             # case 3: a link/neighbor has been deleted
             del self.neighbors[neighbor]
-            self.dv[neighbor] = [[neighbor], math.inf, neighbor]
+            self.refresh_pending.discard(neighbor)
+            if self.COMPACT_DV:
+                self.neighbor_bits &= ~dv_table.node_bit(neighbor)
             print(f"{self.id} lost connection to {neighbor}")
-            self.recompute_own_dv(poisoned_node=neighbor)
-            self.responsible_flood()
+            if self.engine is not None:
+                self.engine.reset()
+            changed = self.recompute_own_dv()
+            self.responsible_flood(changed, urgent=True)
 
-    def recompute_own_dv(self, poisoned_node=-15):
+    def recompute_own_dv(self):
         # REFERENCE --------------------------------------
         # DV STRUCTURE:
         # {node2 : [[path, to, node2], latency, learned_from]}
@@ -106,34 +305,74 @@ class Distance_Vector_Node(Node):
         # node1.neighbors[neighbor][1] == that n's seq
         # node1.neighbors[neighbor][2] == latency to that neighbor
         # END REFERENCE --------------------------------------
-        
-        # start a new dv
-        new_dv = {self.id : [[self.id], 0, -1]}
+
+        # rebuilds the whole dv, returns the set of destinations whose entry changed
+        new_dv = self.full_dv()
+        changed = self.dv_changes(new_dv)
+        self.install_dv(new_dv)
+        return changed
+
+    def dv_changes(self, new_dv):
+        # destinations whose entry differs between self.dv and new_dv
+        changed = {dst for dst in new_dv if self.dv.get(dst) != new_dv[dst]}
+        changed.update(dst for dst in self.dv if dst not in new_dv)
+        return changed
+
+    def install_dv(self, new_dv):
+        if self.COMPACT_DV:
+            self.dv = dv_table.DV_Table()
+            for dst, entry in new_dv.items():
+                self.dv[dst] = entry
+        else:
+            self.dv = new_dv
+
+    def neighbor_routes(self):
+        # routes to ourselves and to every neighbor: the direct link, unless a
+        # neighbor knows a cheaper way to another neighbor
+        if self.engine is not None:
+            return self.engine.neighbor_routes()
+
+        new_dv = {self.id : [self.path_to(self.id), 0, -1]}
 
         for n in self.neighbors:
             # for each neighbor, log our link to new dv
-            new_dv[n] = [[n], self.neighbors[n][2], n]
+            new_dv[n] = [self.path_to(n), self.link_cost(n), n]
 
         # now we optimize paths to neighbors
         for n in self.neighbors:
             # now we steal our neighbors paths (where useful)
             neighbor_dv = self.neighbors[n][0]
-            for n2 in neighbor_dv:
-                if n2 in self.neighbors:
+            for n2 in self.neighbors:
+                entry = neighbor_dv.get(n2)
+                if entry is not None:
                     # only looking at possible paths where dst is a neighbor
-                    neighbor_path_to_n2 = neighbor_dv[n2][0]
-                    neighbor_latency = neighbor_dv[n2][1]
+                    neighbor_path_to_n2 = entry[0]
+                    neighbor_latency = entry[1]
 
                     cost_to_neighbor = new_dv[n][1] 
 
-                    if cost_to_neighbor + neighbor_latency < new_dv[n2][1] and self.id not in neighbor_path_to_n2:
+                    if cost_to_neighbor + neighbor_latency < self.INFINITY and cost_to_neighbor + neighbor_latency < new_dv[n2][1] and not self.on_path(self.id, neighbor_path_to_n2):
                         # MIGHT BE MORE TO CHECK HERE
                         # print(f"found new path from {self.id} to neighbor {n2} : {neighbor_path_to_n2}  @  {neighbor_latency}\nFOUND FROM {n}")
-                        new_dv[n2] = [[n] + neighbor_path_to_n2, neighbor_latency + cost_to_neighbor, n]
-            
+                        new_dv[n2] = [self.join_paths(self.path_to(n), neighbor_path_to_n2), neighbor_latency + cost_to_neighbor, n]
+        return new_dv
 
+    def link_cost(self, n):
+        # our link to neighbor n as a route, at or over INFINITY it is none
+        # (kept at inf, routes through n are then all over INFINITY too)
+        latency = self.neighbors[n][2]
+        return latency if latency < self.INFINITY else math.inf
+
+    def full_dv(self):
+        new_dv = self.neighbor_routes()
+
+        if self.engine is not None:
+            dsts = {dst for n in self.neighbors for dst in self.neighbors[n][0]}
+            dsts = [dst for dst in dsts if dst != self.id and dst not in self.neighbors]
+            for dst, n in self.engine.best_hops(dsts, new_dv).items():
+                new_dv[dst] = self.route_via(n, dst, new_dv)
+            return new_dv
 
-        
         for n in self.neighbors:
             # now we steal our neighbors paths (where useful)
             neighbor_dv = self.neighbors[n][0]
@@ -144,23 +383,123 @@ class Distance_Vector_Node(Node):
 
                     cost_to_neighbor = new_dv[n][1]
 
-                    if neighbor_latency != math.inf and (dst not in new_dv or cost_to_neighbor + neighbor_latency < new_dv[dst][1]) and self.id not in neighbor_path_to_dst:
+                    if neighbor_latency != math.inf and cost_to_neighbor + neighbor_latency < self.INFINITY and (dst not in new_dv or cost_to_neighbor + neighbor_latency < new_dv[dst][1]) and not self.on_path(self.id, neighbor_path_to_dst):
                         flag = 0
 
                         for neigh in self.neighbors:
-                            if neigh in neighbor_path_to_dst and neigh != n:
+                            if self.on_path(neigh, neighbor_path_to_dst) and neigh != n:
                                 flag = 1
                         
                         if flag == 0:
                             # only add the path if it doesn't include
                             # print(f"found new path from {self.id} to {dst} : {neighbor_path_to_dst}  @  {neighbor_latency}\nFOUND FROM {n}")
 
-                            new_dv[dst] = [new_dv[n][0] + neighbor_path_to_dst, neighbor_latency + cost_to_neighbor, n]
+                            new_dv[dst] = [self.join_paths(new_dv[n][0], neighbor_path_to_dst), neighbor_latency + cost_to_neighbor, n]
 
-        
         # print(self)
-        self.dv = new_dv
-        
+        return new_dv
+
+    def update_own_dv(self, affected):
+        # incremental version of recompute_own_dv, only valid while the
+        # neighbor set is unchanged. affected holds the destinations whose
+        # entry changed in some neighbor's vector (and the neighbor whose
+        # link latency changed), returns the set of destinations whose entry
+        # in our dv changed
+        changed = set()
+
+        # routes to neighbors (neighbors^2) feed everything else. they only
+        # depend on link latencies and on what neighbors say about each
+        # other, so they are redone when a neighbor is among the affected
+        # destinations. any destination reachable through a neighbor whose
+        # route changed has to be looked at again
+        if any(dst in self.neighbors for dst in affected):
+            routes = self.neighbor_routes()
+        else:
+            routes = {}
+        for n, entry in routes.items():
+            if self.dv.get(n) != entry:
+                self.dv[n] = entry
+                changed.add(n)
+                if n in self.neighbors:
+                    affected.update(self.neighbors[n][0])
+
+        if self.engine is not None:
+            affected = [dst for dst in affected if dst != self.id and dst not in self.neighbors]
+            hops = self.engine.best_hops(affected, self.dv)
+
+        for dst in affected:
+            if dst == self.id or dst in self.neighbors:
+                continue
+            if self.engine is not None:
+                best = self.route_via(hops[dst], dst, self.dv) if dst in hops else None
+            else:
+                best = self.best_route(dst)
+            if best != self.dv.get(dst):
+                changed.add(dst)
+                if best is None:
+                    del self.dv[dst]
+                else:
+                    self.dv[dst] = best
+
+        if self.VERIFY_DV:
+            full = self.full_dv()
+            mismatched = self.dv_changes(full)
+            if mismatched:
+                print(f"{self.id} INCREMENTAL DV MISMATCH\n{self.dv}\n{full}")
+                changed.update(mismatched)
+                self.install_dv(full)
+        return changed
+
+    def best_route(self, dst):
+        # what full_dv would pick for a non-neighbor dst: the first neighbor
+        # (in neighbor order) with the strictly cheapest route under INFINITY
+        # that goes through neither us nor any other neighbor, None if there
+        # is none
+        best = None
+        for n in self.neighbors:
+            entry = self.neighbors[n][0].get(dst)
+            if entry is None or entry[1] == math.inf:
+                continue
+            cost = self.dv[n][1] + entry[1]
+            if cost >= self.INFINITY or (best is not None and cost >= best[1]):
+                continue
+            if self.loop_free(n, entry[0]):
+                best = [self.join_paths(self.dv[n][0], entry[0]), cost, n]
+        return best
+
+    def route_via(self, n, dst, routes):
+        # our route to dst through neighbor n, routes holds our route to n
+        entry = self.neighbors[n][0][dst]
+        return [self.join_paths(routes[n][0], entry[0]), routes[n][1] + entry[1], n]
+
+    def loop_free(self, n, path):
+        # n's path goes through neither us nor any other neighbor
+        if self.COMPACT_DV:
+            return not path & (self.path_to(self.id) | (self.neighbor_bits ^ self.path_to(n)))
+        for node in path:
+            if node == self.id or (node != n and node in self.neighbors):
+                return False
+        return True
+
+    # PATH HELPERS ------------------------------------------------------------
+    # a path is a list of nodes, or a bitset of node ids if COMPACT_DV
+
+    def path_to(self, node):
+        if self.COMPACT_DV:
+            return dv_table.node_bit(node)
+        return [node]
+
+    def join_paths(self, first, rest):
+        if self.COMPACT_DV:
+            return first | rest
+        return first + rest
+
+    def on_path(self, node, path):
+        if self.COMPACT_DV:
+            return path & dv_table.node_bit(node) != 0
+        return node in path
+
+    # -------------------------------------------------------------------------
 
     def process_incoming_routing_message(self, m):
         # FOR REFERENCE 
@@ -178,15 +517,17 @@ class Distance_Vector_Node(Node):
         # node1.neighbors[neighbor][1] == that n's seq
         # END REFERENCE
 
-        if '|' not in m:
+        message = codec.active.decode(m)
+        if message[0] == 'DVR':
+            # a neighbor lost track of our vector
+            if message[1] in self.neighbors:
+                self.send_full_vector(message[1])
+                self.refreshed.add(message[1])
+            return
+        if message[0] != 'DV' and message[0] != 'DVD':
             # not a real dva
             return
-        parts = m.split('|')
-
-        def int_keys_hook(d):
-               return {int(k): v for k, v in d.items()}
-        
-        sndr, seq, recvd_dv = int(parts[0]), int(parts[1]), json.loads(parts[2], object_hook=int_keys_hook)
+        sndr, seq, recvd_dv = message[1:4]
 
         if sndr not in self.neighbors:
             # if self.id in recvd_dv:
@@ -201,28 +542,102 @@ class Distance_Vector_Node(Node):
             #     return
             return
             
-        if seq > self.neighbors[sndr][1]:
+        affected = set()
+        if message[0] == 'DVD':
+            affected = self.apply_delta(sndr, seq, recvd_dv, message[4])
+
+        elif seq > self.neighbors[sndr][1]:
             # >= because it doesn't hurt if we've heard it before
             # and there could be a glitch case where its useful
 
             # don't trust it too much, keep the latency we've got, if it
             # changes, we'll hear about it
+            if self.DELTA_UPDATES:
+                # split horizon, leave out whatever sndr learned from us
+                recvd_dv = {dst: entry for dst, entry in recvd_dv.items() if entry[2] != self.id}
+                self.refresh_pending.discard(sndr)
+            if self.COMPACT_DV:
+                recvd_dv = dv_table.from_wire(recvd_dv)
+            old_recvd_dv = self.neighbors[sndr][0]
             self.neighbors[sndr] = [recvd_dv, seq, self.neighbors[sndr][2]]
 
+            # only destinations whose entry in sndr's vector changed can move
+            if self.COMPACT_DV:
+                affected = recvd_dv.changed_since(old_recvd_dv)
+            else:
+                affected = {dst for dst in recvd_dv if old_recvd_dv.get(dst) != recvd_dv[dst]}
+                affected.update(dst for dst in old_recvd_dv if dst not in recvd_dv)
+
             # IF WE END UP NEEDING TO POISON INCREASED LINKS, EDIT HERE
-        
-        old_dv = self.dv
-        self.recompute_own_dv()
 
-        if old_dv != self.dv:
+        if self.engine is not None:
+            for dst in affected:
+                self.engine.set_entry(sndr, dst)
+
+        if self.INCREMENTAL_DV:
+            changed = self.update_own_dv(affected)
+        else:
+            changed = self.recompute_own_dv()
+
+        if changed:
             # something changed, share w the world
-            self.responsible_flood()
+            # (right away if we lost a route altogether)
+            urgent = self.FAST_WITHDRAWAL and any(dst not in self.dv for dst in changed)
+            self.responsible_flood(changed, urgent=urgent)
+
+    def apply_delta(self, sndr, seq, entries, withdrawn):
+        # brings our copy of sndr's vector up to date, returns the set of
+        # destinations whose entry in it changed
+        vector, last_seq = self.neighbors[sndr][0], self.neighbors[sndr][1]
+        if seq <= last_seq:
+            # old news
+            return set()
+        if seq > last_seq + 1:
+            # we missed a change (or it is still on its way), deltas on top of
+            # a stale copy are no good until a full vector comes back
+            if sndr not in self.refresh_pending:
+                self.refresh_pending.add(sndr)
+                self.send_to_neighbor(sndr, codec.active.encode_dv_refresh(self.id))
+            return set()
+
+        self.neighbors[sndr][1] = seq
+        affected = set()
+        for dst, entry in entries.items():
+            if entry[2] == self.id:
+                # split horizon, sndr learned this from us
+                if dst in vector:
+                    del vector[dst]
+                    affected.add(dst)
+                continue
+            if self.COMPACT_DV:
+                entry = [dv_table.path_bits(entry[0]), entry[1], entry[2]]
+            if vector.get(dst) != entry:
+                vector[dst] = entry
+                affected.add(dst)
+
+        for dst in withdrawn:
+            if dst in vector:
+                del vector[dst]
+                affected.add(dst)
+        return affected
 
 
 
     def get_next_hop(self, destination):
         # return first step in path to dst if exists, else -1
         if destination in self.dv and self.dv[destination][1] != math.inf:
-            return self.dv[destination][0][0]
+            if not self.COMPACT_DV:
+                return self.dv[destination][0][0]
+
+            # bitset paths have no order: the first hop to a neighbor (or to
+            # ourselves) is who we learned the route from, anything further
+            # goes through that neighbor's route, so its first hop is the
+            # first hop of that route
+            if destination == self.id:
+                return self.id
+            hop = self.dv[destination][2]
+            if destination not in self.neighbors:
+                hop = self.dv[hop][2]
+            return hop
         else:
             return -1
\ No newline at end of file
@@ -0,0 +1,150 @@
+import dv_table
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# --------------------------------------------------------------------------------
+# VECTORIZED BELLMAN-FORD (optional, needs numpy)
+
+# picking routes in Distance_Vector_Node is a min-plus product: for every
+# destination, min over neighbors n of cost_to(n) + n's cost to it. the engine
+# keeps one row per neighbor of a cost matrix over interned destination ids
+# (dv_table.intern), so routes to non-neighbors (pass 2 of full_dv) are one
+# broadcast add and an argmin over the neighbor axis. argmin picks the first
+# minimum and rows are kept in neighbor order, so ties go to the first
+# neighbor just like the strict < in full_dv.
+
+# routes to neighbors (pass 1, neighbor_routes) relax the neighbors one after
+# the other, each with what its own route costs by then. that order matters,
+# it is worked out as a small fixed point over the neighbor x neighbor block
+# (see neighbor_routes).
+
+# everything the python code would skip is folded into the matrix when a row
+# is written: missing entries, ones at or over the node's INFINITY and routes
+# through us cost
+# NO_ROUTE, routes through another neighbor (only skipped in pass 2) are
+# flagged in detours. that flag depends on the neighbor set, so the rows are
+# rebuilt whenever it changes (reset). costs are integers, as in dv_table.
+# --------------------------------------------------------------------------------
+
+available = numpy is not None
+
+# cost matrix value for "no usable route", adding a real cost to it stays
+# well clear of overflowing
+NO_ROUTE = 1 << 60
+
+
+class DV_Engine:
+
+    def __init__(self, node):
+        self.node = node
+        # rows[i] is the neighbor whose vector is in costs[i]
+        self.rows = []
+        self.row_of = {}
+        # columns of the neighbors themselves, and which of the neighbor x
+        # neighbor block lies above the diagonal (row before column)
+        self.neighbor_columns = []
+        self.earlier = numpy.zeros((0, 0), dtype=bool)
+        self.costs = numpy.full((0, 0), NO_ROUTE, dtype=numpy.int64)
+        self.detours = numpy.zeros((0, 0), dtype=bool)
+
+    def reserve(self, size):
+        # makes room for interned indices up to size - 1
+        rows, columns = self.costs.shape
+        if size > columns:
+            size = max(size, 2 * columns)
+            costs = numpy.full((rows, size), NO_ROUTE, dtype=numpy.int64)
+            costs[:, :columns] = self.costs
+            detours = numpy.zeros((rows, size), dtype=bool)
+            detours[:, :columns] = self.detours
+            self.costs, self.detours = costs, detours
+
+    def reset(self):
+        # the neighbor set changed, rebuild every row
+        self.rows = list(self.node.neighbors)
+        self.row_of = {n: i for i, n in enumerate(self.rows)}
+        self.neighbor_columns = [dv_table.intern(n) for n in self.rows]
+        self.earlier = numpy.triu(numpy.ones((len(self.rows), len(self.rows)), dtype=bool), 1)
+        shape = (len(self.rows), len(dv_table.node_ids))
+        self.costs = numpy.full(shape, NO_ROUTE, dtype=numpy.int64)
+        self.detours = numpy.zeros(shape, dtype=bool)
+        for n in self.rows:
+            for dst in self.node.neighbors[n][0]:
+                self.set_entry(n, dst)
+
+    def set_entry(self, n, dst):
+        # n's entry for dst changed (or went away)
+        node = self.node
+        index = dv_table.intern(dst)
+        self.reserve(index + 1)
+        row = self.row_of[n]
+
+        entry = node.neighbors[n][0].get(dst)
+        if entry is None or entry[1] >= node.INFINITY or node.on_path(node.id, entry[0]):
+            self.costs[row, index] = NO_ROUTE
+            self.detours[row, index] = False
+        else:
+            self.costs[row, index] = entry[1]
+            self.detours[row, index] = not node.loop_free(n, entry[0])
+
+    def neighbor_routes(self):
+        # same routes as Distance_Vector_Node.neighbor_routes
+        node = self.node
+        rows = self.rows
+        routes = {node.id: [node.path_to(node.id), 0, -1]}
+        if not rows:
+            return routes
+
+        between = self.costs[:, self.neighbor_columns]
+        direct = numpy.array([min(node.link_cost(n), NO_ROUTE) for n in rows], dtype=numpy.int64)
+
+        # the python loop relaxes every neighbor's route with rows[i]'s route
+        # as it is at step i, which is the direct link or the best route
+        # through an earlier neighbor as it was at its own step. that is a
+        # fixed point over earlier neighbors only, start from the direct
+        # links and redo all of them until nothing moves
+        earlier = numpy.where(self.earlier, between, NO_ROUTE)
+        via_cost = direct
+        while True:
+            through = (earlier + via_cost[:, None]).min(axis=0)
+            relaxed = numpy.minimum(direct, numpy.where(through < node.INFINITY, through, NO_ROUTE))
+            if numpy.array_equal(relaxed, via_cost):
+                break
+            via_cost = relaxed
+
+        # every route ends up through whichever step gave it the cheapest
+        # candidate (the first one on ties), unless none beat the direct link
+        # or stays under INFINITY
+        candidates = between + via_cost[:, None]
+        best = candidates.argmin(axis=0)
+        cheapest = candidates[best, numpy.arange(len(rows))]
+        via = numpy.where((cheapest < direct) & (cheapest < node.INFINITY), best, -1)
+
+        via_cost = via_cost.tolist()
+        for n2, i in zip(rows, via.tolist()):
+            if i < 0:
+                routes[n2] = [node.path_to(n2), node.link_cost(n2), n2]
+            else:
+                n = rows[i]
+                entry = node.neighbors[n][0][n2]
+                routes[n2] = [node.join_paths(node.path_to(n), entry[0]), via_cost[i] + entry[1], n]
+        return routes
+
+    def best_hops(self, dsts, routes):
+        # {dst : neighbor to go through} for every dst in dsts that can be
+        # reached through some neighbor, routes holds our routes to the
+        # neighbors (pass 1)
+        if not self.rows or not dsts:
+            return {}
+        columns = [dv_table.intern(dst) for dst in dsts]
+        self.reserve(len(dv_table.node_ids))
+
+        to_neighbor = numpy.array([min(routes[n][1], NO_ROUTE) for n in self.rows], dtype=numpy.int64)
+        totals = numpy.where(self.detours[:, columns], NO_ROUTE, self.costs[:, columns]) + to_neighbor[:, None]
+        best = totals.argmin(axis=0)
+        reachable = totals[best, numpy.arange(len(columns))] < min(NO_ROUTE, self.node.INFINITY)
+
+        rows = self.rows
+        return {dst: rows[i] for dst, i, ok in zip(dsts, best.tolist(), reachable.tolist()) if ok}
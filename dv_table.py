@@ -0,0 +1,184 @@
+import math
+from array import array
+
+# --------------------------------------------------------------------------------
+# COMPACT DISTANCE VECTOR TABLE
+
+# drop-in replacement for a dv dict ({dst : [path, cost, learned_from]}) that
+# keeps every field in its own column instead of one list per entry. columns
+# are indexed by interned destination, the interning is shared by every table
+# (node ids mean the same thing everywhere), so a table is just its columns.
+
+# paths are bitsets of interned nodes (bit i set == node_ids[i] is on the
+# path) instead of lists: that is all loop prevention needs, and joining two
+# paths is an or. bits go by interned index, not node id, so a path takes as
+# many bits as there are nodes, however large the ids.
+# the order of the path is lost, the first hop is worked out from
+# learned_from instead (see Distance_Vector_Node.get_next_hop). on the wire
+# a path goes out as the sorted list of its nodes (path_nodes / path_bits)
+# --------------------------------------------------------------------------------
+
+# NODE INTERNING
+# node_ids : array of node ids, position == interned index
+# node_index : {node_id : interned_index}
+node_ids = array('q')
+node_index = {}
+
+# costs column value for math.inf (real costs are never negative)
+INFINITE = -1
+
+
+def intern(node):
+    index = node_index.get(node)
+    if index is None:
+        index = len(node_ids)
+        node_index[node] = index
+        node_ids.append(node)
+    return index
+
+
+def node_bit(node):
+    return 1 << intern(node)
+
+
+def path_bits(path):
+    bits = 0
+    for node in path:
+        index = node_index.get(node)
+        if index is None:
+            index = intern(node)
+        bits |= 1 << index
+    return bits
+
+
+def path_nodes(bits):
+    # lowest node id first
+    nodes = []
+    while bits:
+        low = bits & -bits
+        nodes.append(node_ids[low.bit_length() - 1])
+        bits ^= low
+    nodes.sort()
+    return nodes
+
+
+def from_wire(vector):
+    # {dst : [[path, nodes], cost, learned_from]} as decoded off the wire
+    table = DV_Table()
+    for dst in vector:
+        intern(dst)
+    table.reserve(len(node_ids))
+
+    paths, costs, learned = table.paths, table.costs, table.learned_from
+    for dst, (path, cost, learned_from) in vector.items():
+        index = node_index[dst]
+        paths[index] = path_bits(path)
+        costs[index] = INFINITE if cost == math.inf else cost
+        learned[index] = learned_from
+    table.count = len(vector)
+    return table
+
+
+class DV_Table:
+    __slots__ = ('paths', 'costs', 'learned_from', 'count')
+
+    def __init__(self):
+        # paths[i] is None when there is no entry for node_ids[i]
+        self.paths = []
+        self.costs = array('q')
+        self.learned_from = array('q')
+        self.count = 0
+
+    def index(self, dst):
+        # None if there is no entry for dst
+        index = node_index.get(dst)
+        if index is None or index >= len(self.paths) or self.paths[index] is None:
+            return None
+        return index
+
+    def reserve(self, size):
+        # makes room for interned indices up to size - 1
+        missing = size - len(self.paths)
+        if missing > 0:
+            self.paths.extend([None] * missing)
+            self.costs.extend([INFINITE] * missing)
+            self.learned_from.extend([-1] * missing)
+
+    def get(self, dst, default=None):
+        index = node_index.get(dst)
+        if index is None or index >= len(self.paths):
+            return default
+        path = self.paths[index]
+        if path is None:
+            return default
+        cost = self.costs[index]
+        return [path, math.inf if cost == INFINITE else cost, self.learned_from[index]]
+
+    def __getitem__(self, dst):
+        entry = self.get(dst)
+        if entry is None:
+            raise KeyError(dst)
+        return entry
+
+    def __setitem__(self, dst, entry):
+        path, cost, learned_from = entry
+        index = intern(dst)
+        if index >= len(self.paths):
+            self.reserve(len(node_ids))
+
+        if self.paths[index] is None:
+            self.count += 1
+        self.paths[index] = path
+        self.costs[index] = INFINITE if cost == math.inf else cost
+        self.learned_from[index] = learned_from
+
+    def __delitem__(self, dst):
+        index = self.index(dst)
+        if index is None:
+            raise KeyError(dst)
+        self.paths[index] = None
+        self.count -= 1
+
+    def __contains__(self, dst):
+        return self.index(dst) is not None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for index, path in enumerate(self.paths):
+            if path is not None:
+                yield node_ids[index]
+
+    def __str__(self):
+        return str({dst: [path_nodes(path), cost, learned_from] for dst, (path, cost, learned_from) in self.items()})
+
+    def items(self):
+        for dst in self:
+            yield dst, self.get(dst)
+
+    def changed_since(self, old):
+        # destinations whose entry differs between old (a table or a plain
+        # dv dict) and this table
+        if not isinstance(old, DV_Table):
+            changed = {dst for dst in self if old.get(dst) != self.get(dst)}
+            changed.update(dst for dst in old if dst not in self)
+            return changed
+
+        changed = set()
+        size = max(len(self.paths), len(old.paths))
+        self.reserve(size)
+        old.reserve(size)
+        for index, (path, old_path) in enumerate(zip(self.paths, old.paths)):
+            if path != old_path or (path is not None and (self.costs[index] != old.costs[index] or self.learned_from[index] != old.learned_from[index])):
+                changed.add(node_ids[index])
+        return changed
+
+    def to_wire(self):
+        # {dst : [[path, nodes], cost, learned_from]} for every entry
+        vector = {}
+        for index, path in enumerate(self.paths):
+            if path is not None:
+                cost = self.costs[index]
+                vector[node_ids[index]] = [path_nodes(path), math.inf if cost == INFINITE else cost, self.learned_from[index]]
+        return vector
@@ -0,0 +1,98 @@
+import heapq
+import sys
+
+from simulator.event import Event
+from simulator.event_queue import Event_Queue
+
+# --------------------------------------------------------------------------------
+# STREAMING EVENT FILES (see --events=STREAM in sim.py)
+
+# instead of posting every event of the file up front (load_command_file),
+# Sim.dispatch_event pulls them in as the clock gets to them, so the event
+# queue and memory stay the same size however long the file is.
+
+# the order events run in is the same as with the whole file loaded: time,
+# then file order, and file events before routing messages due at the same
+# time (they were posted first). a message sent at time t arrives by t plus
+# the cost of its link at most, so before anything runs at time t every file
+# event up to t + delay is posted, delay being the highest link cost read so
+# far (the links of the network at t were all added or changed by events read
+# already).
+
+# lines are read WINDOW ahead and sorted, so a file only has to be in time
+# order within that window. a line found too late to be posted in order
+# stops the run
+# --------------------------------------------------------------------------------
+
+WINDOW = 10000
+
+LINK_COSTS = ('ADD_LINK', 'CHANGE_LINK')
+
+# set by sim.configure
+enabled = False
+window = WINDOW
+
+# the Event_Stream of the run, None when the event file is loaded whole
+active = None
+
+
+class Event_Stream:
+
+    def __init__(self, event_file, window=WINDOW):
+        self.event_file = event_file
+        self.window = window
+        self.events = self.read(event_file)
+        # heap of (time, line number, event) of the lines read ahead
+        self.ahead = []
+        # highest link cost read so far
+        self.delay = 0
+        # every event of the file up to this time has been posted (and
+        # messages may have been posted since), the time of the last one
+        self.posted_until = None
+        self.last_time = None
+        self.fill()
+
+    def read(self, event_file):
+        # (time, line number, event) of every event line, in file order
+        for number, line in enumerate(open(event_file), 1):
+            line = line.partition('#')[0].strip()
+            if not line:
+                continue
+            fields = line.split()
+            args = [int(x) if x.lstrip('-').isdigit() else x for x in fields[2:]]
+            if fields[1] in LINK_COSTS and len(args) == 3:
+                self.delay = max(self.delay, args[2])
+            yield int(fields[0]), number, Event(int(fields[0]), fields[1], *args)
+
+    def fill(self):
+        for time, number, e in self.events:
+            if (self.posted_until is not None and time <= self.posted_until) or (self.last_time is not None and time < self.last_time):
+                queued = max(t for t in (self.posted_until, self.last_time) if t is not None)
+                sys.stderr.write(f"{self.event_file}:{number}: event at time {time} is out of order by more than "
+                                 f"--event-window={self.window} lines, events up to time {queued} are queued already\n")
+                sys.exit(-1)
+            heapq.heappush(self.ahead, (time, number, e))
+            # the next line to post, and window more
+            if len(self.ahead) > self.window:
+                break
+
+    def feed(self, time):
+        # posts every event up to time + delay, before anything runs at time
+        # (or earlier: posting more of them early changes nothing, whatever
+        # was not posted yet goes after everything in the queue)
+        until = time + self.delay
+        if self.posted_until is not None and until <= self.posted_until:
+            return
+        while self.ahead and self.ahead[0][0] <= until:
+            self.last_time, number, e = heapq.heappop(self.ahead)
+            Event_Queue.Post(e)
+            self.fill()
+        if self.posted_until is None or until > self.posted_until:
+            self.posted_until = until
+
+    def feed_next(self):
+        # the event queue ran dry, posts what comes next. False if nothing is left
+        if not self.ahead:
+            return False
+        self.feed(self.ahead[0][0])
+        return True
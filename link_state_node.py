@@ -1,126 +1,323 @@
 from simulator.node import Node
-import json
+from lsdb import LSDB, Shared_LSDB
+import codec
+import heapq
+import timers
 
 # --------------------------------------------------------------------------------
 # LSA STRUCTURE:
 
-# "LSA|NODE1|NODE2|MESSAGE_SENDER|SEQ_NUM|LINK_COST"
+# (NODE1, NODE2, MESSAGE_SENDER, SEQ_NUM, LINK_COST)
 
-# this way we can just .split('|') and int()
 # node1 and node2 are nodes with the link being advertised abt
 # message_sender is the node that sent this specific version of the lsa
 # --------------------------------------------------------------------------------
 # FULL LSA DATABASE TRANSFER STRUCTURE:
 
-# "DAT|OWNER|SENDER|SEQ|JSON_DUMP_OF_LINK_SEQS|JSON_DUMP_OF_LINK_COSTS"
+# (OWNER, SENDER, SEQ, [(NODE1, NODE2, LINK_COST, LINK_SEQ), ...])
 
+# DATABASE SYNC STRUCTURES (on a new adjacency, see SUMMARY_SYNC):
+
+# DSC : (SENDER, [(NODE1, NODE2, LINK_SEQ), ...])             summary of our db
+# LSR : (SENDER, [(NODE1, NODE2), ...])                       links we want
+# LSU : (SENDER, [(NODE1, NODE2, LINK_COST, LINK_SEQ), ...])  the links asked for
+# ---------------------------------------------------------------------------------
+# BATCHED LSA STRUCTURE (see BATCH_LSAS):
+
+# LSB : (SENDER, [(NODE1, NODE2, LINK_COST, LINK_SEQ), ...])
+
+# every entry is handled exactly like an LSA from SENDER
+# ---------------------------------------------------------------------------------
+# SUMMARY STRUCTURE (see AREAS):
+
+# SUM : (SENDER, [(ORIGIN, DEST, COST, SEQ), ...])
+
+# ORIGIN, an area border router, reaches DEST at COST (-1 once it no longer
+# does). every (ORIGIN, DEST) has a seq of its own, the newest one wins
+
+# all of them are put on the wire by the active codec (see codec.py)
 # ---------------------------------------------------------------------------------
 
 class Link_State_Node(Node):
+    # repair the shortest path tree in place after a link change instead of
+    # throwing it away and rerunning dijkstra on the next query
+    INCREMENTAL_SPF = True
+    # after every repair, also rerun dijkstra from scratch and compare
+    # (falls back to the full result if they disagree)
+    VERIFY_SPF = False
+    # on a new adjacency, trade (link, seq) summaries and then only ship the
+    # links the neighbor is missing or has an older seq of, instead of
+    # dumping the whole database at it
+    SUMMARY_SYNC = True
+    # queue outgoing LSAs and send them as one LSB per neighbor once the
+    # current simulation instant is over (keeping only the newest seq of
+    # each link, see timers.py)
+    BATCH_LSAS = True
+    # keep the database in the store shared by every node (lsdb.py,
+    # Shared_LSDB) instead of a private LSDB per node: same messages, same
+    # routes, a fraction of the memory once the network has converged
+    SHARED_LSDB = False
+    # OSPF style areas : {node : area}, from the AREA lines of the event file
+    # (sim.use_areas), nodes not listed are in area 0, the backbone. empty
+    # (the default) is one flat network.
+    # a link is only flooded in its scope: the area of both its ends, or the
+    # backbone for a link between two areas. an area border router (a node
+    # outside the backbone with a link into another area) also keeps the
+    # backbone's links, in a second database, and tells each side what it
+    # reaches on the other with SUM records. every other node only holds,
+    # floods and runs SPF over the links of its own area (see
+    # inter_area_routes for how the summaries are used)
+    AREAS = {}
+    # whether sim.py follows AREA lines at all (--ls-areas)
+    AREA_LINES = True
+    # a border router waits this long (simulated time) after the first
+    # change before it updates its summaries, so that a change in one area
+    # sends one wave of SUMs through the others instead of one per step its
+    # routes take on the way to converging (0 : at the end of the instant,
+    # --ls-summary-delay)
+    SUMMARY_DELAY = 100
+
     def __init__(self, id):
         super().__init__(id)
 
-        # LSA DATABASE STRUCTURE
-        # link_costs : {frozenset(node1, node2) : latency_btw_node1_node2}
-        # link_seqs : {frozenset(node1, ndoe2) : most_recent_seq_for_link}
-        self.link_costs = {}
-        self.link_seqs = {}
+        # LSA DATABASE STRUCTURE (see lsdb.py)
+        # cost, seq and the adjacency index of every link we know about,
+        # only ever changed through update_link_info / remove_link_info
+        self.lsdb = Shared_LSDB() if self.SHARED_LSDB else LSDB()
+
+        # ROUTING TABLE
+        # next_hops : {destination : next_hop}
+        # only rebuilt (lazily, on the next get_next_hop) once a link cost has
+        # actually changed, routes_dirty tracks whether that happened
+        self.next_hops = {}
+        self.routes_dirty = True
+
+        # SHORTEST PATH TREE (what next_hops is built from)
+        # spt_dist : {reachable_node : distance_from_self}
+        # spt_pred : {reachable_node : predecessor_on_shortest_path}
+        # spt_children : {node : set_of_nodes_whose_predecessor_is_node}
+        # spt_dist is None whenever there is no tree to repair
+        self.spt_dist = None
+        self.spt_pred = {}
+        self.spt_children = {}
 
         # dat_seqs = {node : seq_of_last_database_sent_or_recvd}
         self.dat_seqs = {self.id: 0}
 
         self.neighbors = []
-        self.known_nodes = []
+        self.known_nodes = set()
+
+        # OUTGOING LSA QUEUE
+        # lsa_queue : {neighbor : {(node1, node2) : (seq, cost)}}
+        # sum_queue : {neighbor : {(origin, dest) : (cost, seq)}} SUM records passed on
+        # emptied by flush_lsas at the end of the instant they were filled in,
+        # flush_pending is set while that flush is registered
+        self.lsa_queue = {}
+        self.sum_queue = {}
+        self.flush_pending = False
+
+        # AREAS (unused in a flat network)
+        # area : our area, all self.lsdb holds is links of its scope
+        # backbone : database of the backbone links, border routers only
+        # backbone_tree : (distances, first hops) over backbone, None when stale
+        # summaries : {scope : {(origin, dest) : (cost, seq)}} SUM records heard in scope
+        # originated : {scope : {dest : (cost, seq)}} our own SUM records
+        # advertise : {scope : {dest : cost}} what they should say, as of
+        # the last build_routing_table
+        # summaries_dirty is set whenever that may have changed, and
+        # originate_pending while originate_summaries is registered
+        self.area = self.AREAS.get(id, 0)
+        self.backbone = None
+        self.backbone_tree = None
+        self.summaries = {}
+        self.originated = {}
+        self.advertise = {}
+        self.summaries_dirty = False
+        self.originate_pending = False
 
 
     def __str__(self):
-        return f"[NODE: {self.id} with NEIGBORS: {self.neighbors}\nDATABASE: {self.link_costs}]"
+        return f"[NODE: {self.id} with NEIGBORS: {self.neighbors}\nDATABASE: {self.lsdb}]"
     
     def link_has_been_updated(self, neighbor, latency):
         # -1 if removed
-        if neighbor not in self.known_nodes:
-            self.known_nodes.append(neighbor)
+        self.known_nodes.add(neighbor)
         
-        link = frozenset([self.id, neighbor])
         if neighbor not in self.neighbors and latency != -1:
-            self.link_costs[link] = latency
-            self.link_seqs[link] = 0
+            self.update_link_info(self.id, neighbor, latency, 0)
             self.neighbors.append(neighbor)
             self.begin_flood(neighbor, latency, 0)
-            self.send_my_db(neighbor)
+            if self.SUMMARY_SYNC:
+                self.send_my_summary(neighbor)
+            else:
+                self.send_my_db(neighbor)
+            if self.AREAS:
+                self.send_my_summaries(neighbor)
         elif neighbor in self.neighbors:
-            if latency != -1 and latency != self.link_costs[link]:
-                self.link_costs[link] = latency
-                self.link_seqs[link] += 1
-                self.begin_flood(neighbor, latency, self.link_seqs[link])
+            db = self.db(self.id, neighbor)
+            if latency != -1 and latency != db.get_cost(self.id, neighbor):
+                seq = db.get_seq(self.id, neighbor) + 1
+                self.update_link_info(self.id, neighbor, latency, seq)
+                self.begin_flood(neighbor, latency, seq)
             elif latency == -1:
-                del self.link_costs[link]
-                seq = self.link_seqs[link] + 1
-                del self.link_seqs[link]
-                # del self.link_seqs[link]
+                seq = db.get_seq(self.id, neighbor) + 1
+                self.remove_link_info(self.id, neighbor)
                 self.neighbors.remove(neighbor)
                 self.begin_flood(neighbor, latency, seq)
-        
+
+        self.schedule_flush()
 
 
     # SENDING FUNCTIONS -------------------------------------------------------
 
+    def send_to_neighbor(self, neighbor, m):
+        codec.active.record(m)
+        super().send_to_neighbor(neighbor, m)
+
     def begin_flood(self, neighbor, latency, seq):
         # to be used when a new node is added as our neighbor
-        # LSA STRUCTURE:
-        # "LSA|NODE1|NODE2|MESSAGE_SENDER|SEQ_NUM|LINK_COST"
-        lsa = f"LSA|{self.id}|{neighbor}|{self.id}|{seq}|{latency}"
-        # if latency != -1:
-        #     link = frozenset({self.id, neighbor})
-        #     self.link_seqs[link] += 1
-        for n in self.neighbors:
+        for n in self.flood_neighbors(self.id, neighbor):
             # since neighbor will be doing the same, does not send to neighbor
             if n != neighbor:
-                self.send_to_neighbor(n, lsa)
+                self.send_lsa(n, self.id, neighbor, latency, seq)
 
     def send_lsa(self, neighbor, node1, node2, latency, sequ=-1, dead=0):
         # since it is meant to be used in iteration, it does NOT update seq num for us
-        link = frozenset({node1, node2})
         if sequ == -1:
-            seq = self.link_seqs[link]
+            seq = self.db(node1, node2).get_seq(node1, node2)
         else:
             seq = sequ
 
 
         if dead == 0:
-            lsa = f"LSA|{node1}|{node2}|{self.id}|{seq}|{latency}"
+            cost = latency
         else:
-            lsa = f"LSA|{node1}|{node2}|{self.id}|{seq}|-1"
-        
+            cost = -1
 
-        self.send_to_neighbor(neighbor, lsa)
-        
+        if self.BATCH_LSAS:
+            self.queue_lsa(neighbor, node1, node2, seq, cost)
+        else:
+            self.send_to_neighbor(neighbor, codec.active.encode_lsa(node1, node2, self.id, seq, cost))
+
+    def queue_lsa(self, neighbor, node1, node2, seq, cost):
+        # only the newest seq of a link is kept until the queue is flushed
+        link = (node1, node2) if node1 < node2 else (node2, node1)
+        queued = self.lsa_queue.setdefault(neighbor, {})
+        if link not in queued or seq >= queued[link][0]:
+            queued[link] = (seq, cost)
+
+    def schedule_flush(self):
+        # called at the end of every callback
+        if (self.lsa_queue or self.sum_queue) and not self.flush_pending:
+            self.flush_pending = True
+            timers.at_end_of_instant(self.flush_lsas)
+        if self.summaries_dirty and self.area != 0 and not self.originate_pending and (self.advertise or self.is_border_router()):
+            # (advertise is only set while we are a border router, what we
+            # advertised has to be taken back once we are not)
+            self.originate_pending = True
+            if self.SUMMARY_DELAY:
+                timers.after(self.SUMMARY_DELAY, self.originate_summaries)
+            else:
+                timers.at_end_of_instant(self.originate_summaries)
+
+    def flush_lsas(self):
+        # everything flooded during the instant leaves as one message per
+        # neighbor (a plain LSA if only one link is queued for it), plus one
+        # SUM for the summaries passed on
+        queue = self.lsa_queue
+        self.lsa_queue = {}
+        self.flush_pending = False
+        summaries = self.sum_queue
+        self.sum_queue = {}
+        for neighbor, queued in queue.items():
+            if neighbor not in self.neighbors:
+                # the link went down later in the same instant
+                continue
+            if len(queued) == 1:
+                (node1, node2), (seq, cost) = next(iter(queued.items()))
+                m = codec.active.encode_lsa(node1, node2, self.id, seq, cost)
+            else:
+                m = codec.active.encode_lsb(self.id, [(node1, node2, cost, seq) for (node1, node2), (seq, cost) in queued.items()])
+            self.send_to_neighbor(neighbor, m)
+        for neighbor, queued in summaries.items():
+            if neighbor in self.neighbors:
+                records = [(origin, dest, cost, seq) for (origin, dest), (cost, seq) in queued.items()]
+                self.send_to_neighbor(neighbor, codec.active.encode_sum(self.id, records))
 
     def send_my_db(self, neighbor):
-        # FULL LSA DATABASE TRANSFER STRUCTURE:
-        # "DAT|OWNER|SENDER|SEQ|JSON_DUMP_OF_LINK_SEQS|JSON_DUMP_OF_LINK_COSTS"
-        json_costs = self.dict_to_string(self.link_costs)
-        json_seqs = self.dict_to_string(self.link_seqs)
-        lda = f"DAT|{self.id}|{self.id}|{self.dat_seqs[self.id]}|{json_seqs}|{json_costs}"
+        lda = codec.active.encode_dat(self.id, self.id, self.dat_seqs[self.id], self.db(self.id, neighbor).items())
         self.send_to_neighbor(neighbor, lda)
         self.dat_seqs[self.id] += 1
 
+    def send_my_summary(self, neighbor):
+        digest = [(node1, node2, seq) for node1, node2, cost, seq in self.db(self.id, neighbor).items()]
+        self.send_to_neighbor(neighbor, codec.active.encode_dsc(self.id, digest))
+
+    def send_my_summaries(self, neighbor):
+        # a new adjacency gets every SUM record we hold for its scope, ours too
+        scope = self.scope(self.id, neighbor)
+        records = [(origin, dest, cost, seq) for (origin, dest), (cost, seq) in self.summaries.get(scope, {}).items()]
+        records += [(self.id, dest, cost, seq) for dest, (cost, seq) in self.originated.get(scope, {}).items()]
+        if records:
+            self.send_to_neighbor(neighbor, codec.active.encode_sum(self.id, records))
+
+    def originate_summaries(self):
+        # a border router tells the backbone what it reaches in its area and
+        # its area what it reaches through the backbone (self.advertise), any
+        # other node takes back whatever it told them while it was one. only
+        # the records that changed go out
+        self.originate_pending = False
+        self.summaries_dirty = False
+        if self.routes_dirty:
+            self.build_routing_table()
+
+        for scope in (0, self.area):
+            wanted = self.advertise.get(scope, {})
+            mine = self.originated.setdefault(scope, {})
+            changed = []
+            for dest, cost in wanted.items():
+                old = mine.get(dest)
+                if old is None or old[0] != cost:
+                    changed.append((self.id, dest, cost, 0 if old is None else old[1] + 1))
+            for dest, (cost, seq) in mine.items():
+                if cost != -1 and dest not in wanted:
+                    changed.append((self.id, dest, -1, seq + 1))
+            if not changed:
+                continue
+            for origin, dest, cost, seq in changed:
+                mine[dest] = (cost, seq)
+            m = codec.active.encode_sum(self.id, changed)
+            for n in self.scope_neighbors(scope):
+                self.send_to_neighbor(n, m)
+
     # -------------------------------------------------------------------------
 
     # LSA DATABASE UPKEEP FUNCTIONS --------------------------------------------
 
-    def dict_to_string(self, d):
-        """
-        Convert a dictionary to a string representation.
-        """
-        return json.dumps([[list(k), v] for k, v in d.items()])
+    def scope(self, node1, node2):
+        # the area a link is flooded in (see AREAS)
+        area = self.AREAS.get(node1, 0)
+        return area if area == self.AREAS.get(node2, 0) else 0
+
+    def db(self, node1, node2):
+        # the database a link belongs in
+        if not self.AREAS or self.scope(node1, node2) == self.area:
+            return self.lsdb
+        if self.backbone is None:
+            self.backbone = Shared_LSDB() if self.SHARED_LSDB else LSDB()
+        return self.backbone
 
-    def string_to_dict(self, s):
-        """
-        Convert a string representation back to a dictionary.
-        """
-        return {frozenset(k): v for k, v in json.loads(s)}
-    # credit : the two functions above were created by chatgpt
+    def scope_neighbors(self, scope):
+        if not self.AREAS:
+            return self.neighbors
+        return [n for n in self.neighbors if self.scope(self.id, n) == scope]
+
+    def flood_neighbors(self, node1, node2):
+        # who news of a link goes to, before leaving out where it came from
+        return self.scope_neighbors(self.scope(node1, node2))
+
+    def is_border_router(self):
+        return self.area != 0 and any(self.AREAS.get(n, 0) != self.area for n in self.neighbors)
 
     def get_dat_sequence_number(self, node):
         if node not in self.dat_seqs:
@@ -129,124 +326,307 @@ class Link_State_Node(Node):
             return self.dat_seqs[node]
 
     def get_link_sequence_number(self, node1, node2, link=None):
-        if link == None:
-            link = frozenset(node1, node2)
-        
-        if link not in self.link_seqs:
+        # link, if given, is any (node1, node2) pair and overrides node1/node2
+        if link != None:
+            node1, node2 = link
+
+        seq = self.db(node1, node2).get_seq(node1, node2)
+        if seq is None:
             return -1
         else:
-            return self.link_seqs[link]
+            return seq
 
 
 
     def update_link_info(self, neighbor1, neighbor2, latency, seq, link=None):
-        if link == None:
-            link = frozenset({neighbor1, neighbor2})
-        self.link_costs[link] = latency
-        self.link_seqs[link] = seq
+        if link != None:
+            neighbor1, neighbor2 = link
+        db = self.db(neighbor1, neighbor2)
+        old_latency = db.set(neighbor1, neighbor2, latency, seq)
+
+        if old_latency != latency:
+            self.routes_dirty = True
+            self.summaries_dirty = True
+            if db is self.lsdb:
+                self.spt_link_changed(neighbor1, neighbor2, old_latency, latency)
+            else:
+                self.backbone_tree = None
+
+    def remove_link_info(self, node1, node2):
+        # forgets a link entirely (cost, seq and both adjacency entries)
+        db = self.db(node1, node2)
+        old_latency = db.remove(node1, node2)
+        self.routes_dirty = True
+        self.summaries_dirty = True
+
+        if db is self.lsdb:
+            self.spt_link_changed(node1, node2, old_latency, None)
+        else:
+            self.backbone_tree = None
     
     # --------------------------------------------------------------------------
 
-    def process_incoming_routing_message(self, m: str):
-        classifier = m[0:3]
+    def process_incoming_routing_message(self, m):
+        message = codec.active.decode(m)
+        classifier = message[0]
         if classifier == 'LSA':
-            
             # case 1 : received an LSA
             # LSA STRUCTURE:
-            # "LSA|NODE1|NODE2|MESSAGE_SENDER|SEQ_NUM|LINK_COST"
-            parts = m[4:].split('|')
-            node1, node2, sndr, seq, lat = int(parts[0]), int(parts[1]), int(parts[2]), int(parts[3]), int(parts[4])
-            if node1 not in self.known_nodes:
-                self.known_nodes.append(node1)
-            if node2 not in self.known_nodes:
-                self.known_nodes.append(node2)
-
-            link = frozenset({node1, node2})
-            if self.id in link:
-                # case 1: info about my link,
-                # it will receive the information on its own, and can ignore
-                return
-            elif link not in self.link_costs and lat == -1:
-                # in this case we've already deleted this link and don't wanna redo this
-                return
-
-            elif seq > self.get_link_sequence_number(node1, node2, link=link):
-                # print(f"\n\n{self.id} ACCEPTING {m} with my\nseqs: {self.link_seqs}\ncosts: {self.link_costs}\n\n")
-                if lat != -1:
-                    self.update_link_info(node1, node2, lat, seq, link=link)
-
-                    for n in self.neighbors:
-                        
-                        if n != sndr:
-                            # print(f"{self.id} FORWARDING ({link} : {lat}) TO {n}")
-                            self.send_lsa(n, node1, node2, lat, seq)
-                else:
-                    if link in self.link_costs:
-                        # del self.link_seqs[link]
-                        del self.link_costs[link]
-                        del self.link_seqs[link]
-                        for n in self.neighbors:
-                            if n != sndr:
-                                self.send_lsa(n, node1, node2, lat, seq, dead=1)
-            elif seq == self.get_link_sequence_number(node1, node2, link=link):
-                # print(f"\n\n{self.id} IGNORING {m} with my\nseqs: {self.link_seqs}\ncosts: {self.link_costs}\n\n")
-                pass
-            elif seq < self.get_link_sequence_number(node1, node2, link=link):
-                # print(f"\n\n{self.id} REJECTING {m} with my\nseqs: {self.link_seqs}\ncosts: {self.link_costs}\n\n")
-                self.send_lsa(sndr, node1, node2, lat)
+            # (NODE1, NODE2, MESSAGE_SENDER, SEQ_NUM, LINK_COST)
+            node1, node2, sndr, seq, lat = message[1:]
+            self.process_lsa(node1, node2, sndr, seq, lat)
+
+        elif classifier == 'LSB':
+            # case 1b : a batch of LSAs
+            sndr, links = message[1:]
+            for node1, node2, lat, seq in links:
+                self.process_lsa(node1, node2, sndr, seq, lat)
 
         elif classifier == 'DAT':
             # case 2 : received a database
-            if len(m) == 4:
-                # should never happen, idk why i check
-                return
             # FULL LSA DATABASE TRANSFER STRUCTURE:
-            # "DAT|OWNER|SENDER|SEQ|JSON_DUMP_OF_LINK_SEQS|JSON_DUMP_OF_LINK_COSTS"
-            
-            parts = m[4:].split('|')
-            owner, sndr, seq, link_seqs, link_costs = int(parts[0]), int(parts[1]), int(parts[2]), self.string_to_dict(parts[3]), self.string_to_dict(parts[4])
+            # (OWNER, SENDER, SEQ, [(NODE1, NODE2, LINK_COST, LINK_SEQ), ...])
+            owner, sndr, seq, links = message[1:]
 
             if owner not in self.dat_seqs or seq > self.dat_seqs[owner]:
-                # copy over the received database for every link it doesn't have
-                # or if db's link info is more recent
                 self.dat_seqs[owner] = seq
-                for link in link_costs:
-                    linkseq = link_seqs[link]
-                    if linkseq > self.get_link_sequence_number(0, 0, link):
-                        # since get_link_seq_number returns -1 on link not found
-                        # this effectively tests if link exists as well 
-                        nodes = list(link)
-                        node1 = nodes[0]
-                        node2 = nodes[1]
-                        lat = link_costs[link]
-                        if node1 not in self.known_nodes:
-                            self.known_nodes.append(node1)
-                        if node2 not in self.known_nodes:
-                            self.known_nodes.append(node1)
-
-                        self.update_link_info(node1, node2, lat, linkseq, link)
-                        for n in self.neighbors:
-                            if n != sndr and n != owner:
-                                self.send_lsa(n, node1, node2, lat, linkseq)
-
+                self.merge_links(links, (sndr, owner))
+
+        elif classifier == 'DSC':
+            # case 3 : a new neighbor summarized its database,
+            # ask for every link we don't have or only have an older seq of
+            sndr, digest = message[1:]
+            wanted = [(node1, node2) for node1, node2, linkseq in digest
+                      if linkseq > self.get_link_sequence_number(node1, node2)]
+            if wanted:
+                self.send_to_neighbor(sndr, codec.active.encode_lsr(self.id, wanted))
+
+        elif classifier == 'LSR':
+            # case 4 : send back what was asked for (links deleted since the
+            # summary went out are skipped, their dead LSA is already flooding)
+            sndr, wanted = message[1:]
+            links = []
+            for node1, node2 in wanted:
+                db = self.db(node1, node2)
+                slot = db.slot(node1, node2)
+                if slot is not None:
+                    links.append((node1, node2, db.costs[slot], db.seqs[slot]))
+            if links:
+                self.send_to_neighbor(sndr, codec.active.encode_lsu(self.id, links))
+
+        elif classifier == 'LSU':
+            # case 5 : the links we asked for
+            sndr, links = message[1:]
+            self.merge_links(links, (sndr,))
+
+        elif classifier == 'SUM':
+            # case 6 : summaries from border routers (see AREAS)
+            sndr, records = message[1:]
+            self.process_summaries(sndr, records)
+
+        self.schedule_flush()
+
+    def process_lsa(self, node1, node2, sndr, seq, lat):
+        # returns what became of the LSA: 'accepted', 'ignored' or 'stale'
+        # (counted by metrics.py)
+        self.known_nodes.add(node1)
+        self.known_nodes.add(node2)
+
+        my_seq = self.get_link_sequence_number(node1, node2)
+        if self.id == node1 or self.id == node2:
+            # case 1: info about my link,
+            # it will receive the information on its own, and can ignore
+            return 'ignored'
+        elif my_seq == -1 and lat == -1:
+            # in this case we've already deleted this link and don't wanna redo this
+            return 'ignored'
+
+        elif seq > my_seq:
+            # print(f"\n\n{self.id} ACCEPTING {m} with my\ndatabase: {self.lsdb}\n\n")
+            if lat != -1:
+                self.update_link_info(node1, node2, lat, seq)
+
+                for n in self.flood_neighbors(node1, node2):
                     
+                    if n != sndr:
+                        # print(f"{self.id} FORWARDING ({link} : {lat}) TO {n}")
+                        self.send_lsa(n, node1, node2, lat, seq)
+            else:
+                if my_seq != -1:
+                    self.remove_link_info(node1, node2)
+                    for n in self.flood_neighbors(node1, node2):
+                        if n != sndr:
+                            self.send_lsa(n, node1, node2, lat, seq, dead=1)
+            return 'accepted'
+        elif seq == my_seq:
+            # print(f"\n\n{self.id} IGNORING {m} with my\ndatabase: {self.lsdb}\n\n")
+            return 'ignored'
+        else:
+            # print(f"\n\n{self.id} REJECTING {m} with my\ndatabase: {self.lsdb}\n\n")
+            self.send_lsa(sndr, node1, node2, self.db(node1, node2).get_cost(node1, node2))
+            return 'stale'
+
+    def process_summaries(self, sndr, records):
+        # keeps every record newer than the one we hold and floods those on
+        # in the scope they came in (at the end of the instant, see flush_lsas)
+        scope = self.scope(self.id, sndr)
+        held = self.summaries.setdefault(scope, {})
+        accepted = []
+        for origin, dest, cost, seq in records:
+            old = held.get((origin, dest))
+            if origin != self.id and (old is None or seq > old[1]):
+                held[(origin, dest)] = (cost, seq)
+                accepted.append((origin, dest, cost, seq))
+        if not accepted:
+            return
+
+        self.routes_dirty = True
+        if scope == 0:
+            # what a border router tells its area depends on them
+            self.summaries_dirty = True
+        for n in self.scope_neighbors(scope):
+            if n != sndr:
+                queued = self.sum_queue.setdefault(n, {})
+                for origin, dest, cost, seq in accepted:
+                    # only the newest seq of a record is kept
+                    queued[(origin, dest)] = (cost, seq)
+
+    def merge_links(self, links, skip):
+        # copy over every (NODE1, NODE2, LINK_COST, LINK_SEQ) we don't have or
+        # have an older seq of, and pass it on to every neighbor not in skip
+        for node1, node2, lat, linkseq in links:
+            if linkseq > self.get_link_sequence_number(node1, node2):
+                # since get_link_seq_number returns -1 on link not found
+                # this effectively tests if link exists as well 
+                self.known_nodes.add(node1)
+                self.known_nodes.add(node2)
+
+                # a database can change many links at once, cheaper to
+                # rebuild the tree on the next query than to repair it
+                # once per link
+                self.spt_dist = None
+                self.update_link_info(node1, node2, lat, linkseq)
+                for n in self.flood_neighbors(node1, node2):
+                    if n not in skip:
+                        self.send_lsa(n, node1, node2, lat, linkseq)
 
 
     def get_next_hop(self, destination):
         if destination == self.id:
             # this might be wrongs
             return self.id
-        path = self.generate_path(destination)
-        return path[0]
+        if self.routes_dirty:
+            self.build_routing_table()
+        return self.next_hops.get(destination, -1)
 
 
     # PATH GENERATION FUNCTIONS ------------------------------------------------
 
+    def build_routing_table(self):
+        # fills self.next_hops with the first hop towards every reachable node
+        if self.spt_dist is None:
+            distances, predecessors = self.full_spf()
+            self.store_spt(distances, predecessors)
+
+        next_hops = self.first_hops(self.spt_pred)
+        if self.AREAS:
+            self.inter_area_routes(next_hops)
+
+        self.next_hops = next_hops
+        self.routes_dirty = False
+
+    def first_hops(self, predecessors):
+        # {node : first hop towards it} of a tree rooted at self
+        next_hops = {}
+        for dst in predecessors:
+            if dst == self.id:
+                continue
+            # walk back up the tree until we reach a node whose first hop is
+            # already known, or one of our direct neighbors in the tree
+            chain = []
+            path_node = dst
+            while path_node not in next_hops:
+                chain.append(path_node)
+                pred = predecessors[path_node]
+                if pred == self.id:
+                    break
+                path_node = pred
+
+            hop = next_hops[path_node] if path_node in next_hops else path_node
+            for node in chain:
+                next_hops[node] = hop
+        return next_hops
+
+    def inter_area_routes(self, next_hops):
+        # adds the routes to nodes of other areas to next_hops (our own
+        # area's tree) and refreshes self.advertise, as OSPF does it:
+        # - nodes of our own area only ever go by our area's tree
+        # - backbone routers (area 0 and border routers) reach area 0 over
+        #   the backbone's tree, and a node of any other area through the
+        #   border router of that area whose summary makes it cheapest
+        # - every other node goes to whichever border router of its own area
+        #   is cheapest for a node outside it, by that router's summary. so
+        #   does a border router for what the backbone does not get it to
+        #   (its part of the backbone is cut off from the rest)
+        # every route therefore stays inside one area or the backbone until
+        # it reaches the area of its destination, and the cost of the rest
+        # of the way keeps going down, so there are no loops
+        areas = self.AREAS
+        border = self.is_border_router()
+        home = (self.spt_dist, dict(next_hops), self.lsdb.node_index)
+        if self.area == 0:
+            # border routers of other areas are in our tree too, but they
+            # are reached like the rest of their area
+            for dest in [dest for dest in next_hops if areas.get(dest, 0) != 0]:
+                del next_hops[dest]
+            stages = [(0, home)]
+        elif border:
+            if self.backbone_tree is None:
+                distances, predecessors = self.full_spf(self.backbone)
+                self.backbone_tree = (distances, self.first_hops(predecessors))
+            distances, hops = self.backbone_tree
+            for dest, hop in hops.items():
+                if areas.get(dest, 0) == 0:
+                    next_hops[dest] = hop
+            stages = [(0, (distances, hops, self.backbone.node_index)), (self.area, home)]
+        else:
+            stages = [(self.area, home)]
+
+        for scope, (distances, hops, rank) in stages:
+            best = self.best_summaries(scope, distances, rank)
+            for dest, (key, origin) in best.items():
+                if dest not in next_hops:
+                    next_hops[dest] = hops[origin]
+            if border and scope == 0:
+                # summarized like an OSPF area range: every node of our area
+                # (and of the backbone) is advertised at the cost of the
+                # farthest one, so a change inside an area only goes further
+                # when it moves that
+                backbone_nodes = [dest for dest in distances if areas.get(dest, 0) == 0]
+                outside = dict.fromkeys(backbone_nodes, max([distances[dest] for dest in backbone_nodes], default=0))
+                outside.update((dest, key[0]) for dest, (key, origin) in best.items())
+                self.advertise = {0: dict.fromkeys(self.spt_dist, max(self.spt_dist.values())), self.area: outside}
+        if not border:
+            self.advertise = {}
+
+    def best_summaries(self, scope, distances, rank):
+        # {dest : ((cost, rank of origin), origin)} the cheapest border router
+        # to every node outside our area the summaries of scope offer, by
+        # distances (from self) to the border routers
+        best = {}
+        for (origin, dest), (cost, seq) in self.summaries.get(scope, {}).items():
+            if cost == -1 or origin not in distances or self.AREAS.get(dest, 0) == self.area:
+                continue
+            key = (distances[origin] + cost, rank.get(origin, len(rank)))
+            if dest not in best or key < best[dest][0]:
+                best[dest] = (key, origin)
+        return best
+
     def generate_path(self, dst):
         # will return a list representing path between self and dst
         # or -1 if no path is found 
         path_dict = self.dijkstra()
-        # print(f"just dijkstrad:\nlink_costs = {self.link_costs}\nknown_nodes = {self.known_nodes}\nself = {self.id}\ndijkstra result = {path_dict}")
+        # print(f"just dijkstrad:\ndatabase = {self.lsdb}\nknown_nodes = {self.known_nodes}\nself = {self.id}\ndijkstra result = {path_dict}")
         if dst not in path_dict:
             return [-1]
         
@@ -255,53 +635,177 @@ class Link_State_Node(Node):
         while path_node != self.id:
             if path_node == None:
                 return [-1]
-            path.insert(0, path_node)
+            path.append(path_node)
             path_node = path_dict[path_node][0]
-        
+
+        path.reverse()
         return path
 
     def dijkstra(self):
-        # Initialize distances dictionary with infinity for all nodes except the start node
-        distances = {node: float('inf') for node in self.known_nodes}
-        distances[self.id] = 0
-
-        # Initialize dictionary to store predecessor nodes and their respective costs
-        predecessors = {node: None for node in self.known_nodes}
-
-        # Set of nodes whose shortest path from the start node is already determined
-        visited = set()
-
-        while len(visited) < len(self.known_nodes):
-            # Find the node with the minimum distance from the start node
-            min_node = None
-            min_distance = float('inf')
-            for node, distance in distances.items():
-                if node not in visited and distance < min_distance:
-                    min_node = node
-                    min_distance = distance
-
-            if min_node is None:
-                break  # All remaining nodes are unreachable
-
-            visited.add(min_node)
-
-            # Update distances for neighbors of the current node
-            for link, cost in self.link_costs.items():
-                if min_node in link:
-                    other_node = next(iter(link - {min_node}))
-                    total_cost = distances[min_node] + cost
-                    if other_node not in distances:
-                        distances[other_node] = float('inf')  # Initialize if not present
-                    if total_cost < distances[other_node]:
-                        distances[other_node] = total_cost
-                        predecessors[other_node] = min_node
-
-
+        # returns {node : [predecessor, distance]} for every node but self,
+        # unreachable nodes get [None, inf]
+        distances, predecessors = self.full_spf()
 
         # Construct the shortest_paths dictionary
-        shortest_paths = {}
+        shortest_paths = {node: [None, float('inf')] for node in self.known_nodes if node != self.id}
         for node, distance in distances.items():
             if node != self.id:
                 shortest_paths[node] = [predecessors[node], distance]
 
         return shortest_paths
+
+    def full_spf(self, lsdb=None):
+        # binary heap dijkstra over the adjacency index of lsdb (ours by default)
+        # returns ({node : distance}, {node : predecessor}) for reachable nodes
+        if lsdb is None:
+            lsdb = self.lsdb
+
+        # ties are settled in the order nodes first showed up in the database
+        rank = lsdb.node_index
+        adjacency = lsdb.adjacency
+        costs = lsdb.costs
+
+        distances = {self.id: 0}
+        predecessors = {self.id: None}
+        visited = set()
+
+        heap = [(0, rank.get(self.id, -1), self.id)]
+        while heap:
+            distance, _, node = heapq.heappop(heap)
+            if node in visited:
+                # stale heap entry, node was settled with a shorter distance
+                continue
+            visited.add(node)
+
+            for other_node, slot in adjacency.get(node, {}).items():
+                total_cost = distance + costs[slot]
+                if other_node not in distances or total_cost < distances[other_node]:
+                    distances[other_node] = total_cost
+                    predecessors[other_node] = node
+                    heapq.heappush(heap, (total_cost, rank.get(other_node, len(rank)), other_node))
+
+        return distances, predecessors
+
+    # INCREMENTAL SPF FUNCTIONS ------------------------------------------------
+    # (dynamic SPT repair in the style of Ramalingam-Reps / OSPF iSPF)
+
+    def store_spt(self, distances, predecessors):
+        self.spt_dist = distances
+        self.spt_pred = predecessors
+        self.spt_children = {}
+        for node, pred in predecessors.items():
+            if pred != None:
+                self.spt_children.setdefault(pred, set()).add(node)
+
+    def spt_set_pred(self, node, pred):
+        old_pred = self.spt_pred.get(node)
+        if old_pred != None:
+            self.spt_children[old_pred].discard(node)
+        self.spt_pred[node] = pred
+        if pred != None:
+            self.spt_children.setdefault(pred, set()).add(node)
+
+    def spt_link_changed(self, node1, node2, old_latency, new_latency):
+        # called after adjacency already reflects the change
+        # old_latency / new_latency are None when the link did not / no longer exists
+        if self.spt_dist is None:
+            # nothing built yet, the next query will run the full SPF anyway
+            return
+        if not self.INCREMENTAL_SPF:
+            self.spt_dist = None
+            return
+
+        if old_latency is None or (new_latency is not None and new_latency < old_latency):
+            self.spt_link_improved(node1, node2, new_latency)
+        else:
+            self.spt_link_worsened(node1, node2)
+
+        if self.VERIFY_SPF:
+            distances, predecessors = self.full_spf()
+            if distances != self.spt_dist or predecessors != self.spt_pred:
+                print(f"{self.id} incremental SPF disagrees with full recompute, using full result")
+                self.store_spt(distances, predecessors)
+
+    def spt_first(self, rank, node, other_node):
+        # whether full_spf would have settled other_node before node, the one
+        # it settles first is the predecessor it keeps on an equal cost path
+        if node is None:
+            return False
+        return (self.spt_dist[other_node], rank.get(other_node, len(rank))) < (self.spt_dist[node], rank.get(node, len(rank)))
+
+    def spt_link_improved(self, node1, node2, latency):
+        # a cheaper (or brand new) link can only shorten paths, so only the
+        # nodes it actually improves are touched (or, on an equal cost path,
+        # get the predecessor full_spf would pick)
+        rank = self.lsdb.node_index
+        heap = []
+        for a, b in ((node1, node2), (node2, node1)):
+            if a not in self.spt_dist:
+                continue
+            total_cost = self.spt_dist[a] + latency
+            if total_cost < self.spt_dist.get(b, float('inf')):
+                self.spt_dist[b] = total_cost
+                self.spt_set_pred(b, a)
+                heapq.heappush(heap, (total_cost, rank.get(b, len(rank)), b))
+            elif total_cost == self.spt_dist[b] and self.spt_first(rank, self.spt_pred[b], a):
+                self.spt_set_pred(b, a)
+        self.spt_propagate(rank, heap)
+
+    def spt_link_worsened(self, node1, node2):
+        # a dearer (or removed) link only matters if it was in the tree, and
+        # then only for the subtree hanging below it
+        if self.spt_pred.get(node2) == node1:
+            child = node2
+        elif self.spt_pred.get(node1) == node2:
+            child = node1
+        else:
+            return
+
+        affected = set()
+        stack = [child]
+        while stack:
+            node = stack.pop()
+            affected.add(node)
+            stack.extend(self.spt_children.get(node, ()))
+
+        for node in affected:
+            self.spt_set_pred(node, None)
+            del self.spt_pred[node]
+            del self.spt_dist[node]
+
+        # reattach each affected node through its best link to the untouched
+        # part of the tree, then settle the subtree among itself
+        rank = self.lsdb.node_index
+        heap = []
+        for node in affected:
+            best, best_pred = float('inf'), None
+            for other_node, slot in self.lsdb.adjacency.get(node, {}).items():
+                if other_node not in self.spt_dist:
+                    continue
+                total_cost = self.spt_dist[other_node] + self.lsdb.costs[slot]
+                if total_cost < best or (total_cost == best and self.spt_first(rank, best_pred, other_node)):
+                    best, best_pred = total_cost, other_node
+            if best_pred != None:
+                self.spt_dist[node] = best
+                self.spt_set_pred(node, best_pred)
+                heapq.heappush(heap, (best, rank.get(node, len(rank)), node))
+        self.spt_propagate(rank, heap, affected)
+
+    def spt_propagate(self, rank, heap, allowed=None):
+        # dijkstra from the seeded heap, only relaxing into allowed (if given).
+        # heap entries are (distance, rank, node) as in full_spf, and an equal
+        # cost path takes the predecessor full_spf would have settled first
+        while heap:
+            distance, _, node = heapq.heappop(heap)
+            if distance > self.spt_dist[node]:
+                continue
+            for other_node, slot in self.lsdb.adjacency.get(node, {}).items():
+                if allowed is not None and other_node not in allowed:
+                    continue
+                total_cost = distance + self.lsdb.costs[slot]
+                if total_cost < self.spt_dist.get(other_node, float('inf')):
+                    self.spt_dist[other_node] = total_cost
+                    self.spt_set_pred(other_node, node)
+                    heapq.heappush(heap, (total_cost, rank.get(other_node, len(rank)), other_node))
+                elif total_cost == self.spt_dist[other_node] and self.spt_first(rank, self.spt_pred[other_node], node):
+                    self.spt_set_pred(other_node, node)
@@ -0,0 +1,390 @@
+from array import array
+
+# --------------------------------------------------------------------------------
+# COMPACT LINK STATE DATABASE
+
+# node ids are interned to small indices the first time a link mentions them.
+# every link gets a slot, and its endpoints (as interned indices), cost and seq
+# live in flat arrays at that slot. the only per-link python objects left are
+# the two adjacency entries pointing at the slot, which is also how a link is
+# looked up. slots of deleted links are reused, so the arrays only grow with
+# the peak number of links ever held at once
+# --------------------------------------------------------------------------------
+
+FREE_SLOT = -1
+
+
+class LSDB:
+    __slots__ = ('node_ids', 'node_index', 'ends', 'costs', 'seqs', 'free_slots', 'adjacency', 'link_count')
+
+    def __init__(self):
+        # NODE INTERNING
+        # node_ids : array of node ids, position == interned index
+        # node_index : {node_id : interned_index}
+        self.node_ids = array('q')
+        self.node_index = {}
+
+        # LINK STORAGE
+        # ends[2 * slot], ends[2 * slot + 1] : interned endpoints (FREE_SLOT if unused)
+        # costs[slot] / seqs[slot] : cost and most recent seq of that link
+        self.ends = array('l')
+        self.costs = array('q')
+        self.seqs = array('q')
+        self.free_slots = []
+        self.link_count = 0
+
+        # ADJACENCY INDEX (what dijkstra walks)
+        # adjacency : {node : {other_node : slot_of_link_btw_them}}
+        self.adjacency = {}
+
+    def __len__(self):
+        return self.link_count
+
+    def __contains__(self, link):
+        node1, node2 = link
+        return self.slot(node1, node2) is not None
+
+    def __str__(self):
+        # printed like the {frozenset({node1, node2}) : cost} dict nodes used to keep
+        return str({frozenset((node1, node2)): cost for node1, node2, cost, seq in self.items()})
+
+    def intern(self, node):
+        index = self.node_index.get(node)
+        if index is None:
+            index = len(self.node_ids)
+            self.node_index[node] = index
+            self.node_ids.append(node)
+        return index
+
+    def slot(self, node1, node2):
+        # None if there is no such link
+        return self.adjacency.get(node1, {}).get(node2)
+
+    def get_cost(self, node1, node2):
+        slot = self.slot(node1, node2)
+        return None if slot is None else self.costs[slot]
+
+    def get_seq(self, node1, node2):
+        slot = self.slot(node1, node2)
+        return None if slot is None else self.seqs[slot]
+
+    def set(self, node1, node2, cost, seq):
+        # stores (or overwrites) a link, returns its previous cost or None if new
+        slot = self.slot(node1, node2)
+        if slot is not None:
+            old_cost = self.costs[slot]
+            self.costs[slot] = cost
+            self.seqs[slot] = seq
+            return old_cost
+
+        index1, index2 = self.intern(node1), self.intern(node2)
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.ends[2 * slot] = index1
+            self.ends[2 * slot + 1] = index2
+            self.costs[slot] = cost
+            self.seqs[slot] = seq
+        else:
+            slot = len(self.costs)
+            self.ends.append(index1)
+            self.ends.append(index2)
+            self.costs.append(cost)
+            self.seqs.append(seq)
+
+        self.adjacency.setdefault(node1, {})[node2] = slot
+        self.adjacency.setdefault(node2, {})[node1] = slot
+        self.link_count += 1
+        return None
+
+    def remove(self, node1, node2):
+        # forgets a link entirely (cost, seq and adjacency), returns its old cost
+        slot = self.adjacency[node1].pop(node2)
+        del self.adjacency[node2][node1]
+
+        self.ends[2 * slot] = FREE_SLOT
+        self.ends[2 * slot + 1] = FREE_SLOT
+        self.free_slots.append(slot)
+        self.link_count -= 1
+        return self.costs[slot]
+
+    def items(self):
+        # yields (node1, node2, cost, seq) for every link held
+        ends = self.ends
+        for slot in range(len(self.costs)):
+            index1 = ends[2 * slot]
+            if index1 != FREE_SLOT:
+                yield self.node_ids[index1], self.node_ids[ends[2 * slot + 1]], self.costs[slot], self.seqs[slot]
+
+
+# --------------------------------------------------------------------------------
+# SHARED LINK STATE DATABASE (see Link_State_Node.SHARED_LSDB)
+
+# once flooding has converged every node holds the same links with the same
+# costs and seqs, so a private LSDB per node stores the same thing n times.
+# here every link gets one global slot (and one adjacency entry) shared by
+# every database, and a database only holds (cost, seq) records at those slots.
+# records are interned tuples, kept in immutable chunks of CHUNK slots that are
+# interned too: databases that agree on a chunk hold the very same tuple, a
+# write copies just the chunk it lands in (copy on write), so a node only pays
+# for the chunks it disagrees with everybody else on.
+
+# what stays per database is what makes it behave exactly like an LSDB: its own
+# tie ranks (order nodes first showed up in it) and its own slot order (what
+# items() yields, so messages list links in the same order)
+# --------------------------------------------------------------------------------
+
+CHUNK = 32
+CHUNK_BITS = 5
+
+# shared by every Shared_LSDB
+# shared_node_ids / shared_node_index : node interning, as in LSDB
+# shared_ends[2 * slot], shared_ends[2 * slot + 1] : interned endpoints of a global slot
+# shared_adjacency : {node : {other_node : global_slot}} every link any database ever held
+# records : {(cost, seq) : [the one tuple for it, slots holding it in any database]}
+# chunks : {chunk : [the one tuple for it, databases holding it]}
+shared_node_ids = array('q')
+shared_node_index = {}
+shared_ends = array('l')
+shared_adjacency = {}
+records = {}
+EMPTY_CHUNK = (None,) * CHUNK
+chunks = {EMPTY_CHUNK: [EMPTY_CHUNK, 1]}
+
+UNRANKED = -1
+
+
+def shared_intern(node):
+    index = shared_node_index.get(node)
+    if index is None:
+        index = len(shared_node_ids)
+        shared_node_index[node] = index
+        shared_node_ids.append(node)
+    return index
+
+
+def shared_slot(node1, node2):
+    # global slot of a link, made up the first time any database stores it
+    slot = shared_adjacency.get(node1, {}).get(node2)
+    if slot is None:
+        slot = len(shared_ends) // 2
+        shared_ends.append(shared_intern(node1))
+        shared_ends.append(shared_intern(node2))
+        shared_adjacency.setdefault(node1, {})[node2] = slot
+        shared_adjacency.setdefault(node2, {})[node1] = slot
+    return slot
+
+
+def share_record(cost, seq):
+    entry = records.get((cost, seq))
+    if entry is None:
+        record = (cost, seq)
+        entry = records[record] = [record, 0]
+    entry[1] += 1
+    return entry[0]
+
+
+def release_record(record):
+    entry = records[record]
+    entry[1] -= 1
+    if entry[1] == 0:
+        del records[record]
+
+
+def share_chunk(content):
+    entry = chunks.get(content)
+    if entry is None:
+        entry = chunks[content] = [content, 0]
+    entry[1] += 1
+    return entry[0]
+
+
+def release_chunk(chunk):
+    if chunk is EMPTY_CHUNK:
+        return
+    entry = chunks[chunk]
+    entry[1] -= 1
+    if entry[1] == 0:
+        del chunks[chunk]
+
+
+class Shared_Adjacency:
+    # adjacency.get(node) of a Shared_LSDB: the links of node it holds,
+    # {other_node : global_slot}
+    __slots__ = ('db',)
+
+    def __init__(self, db):
+        self.db = db
+
+    def get(self, node, default=None):
+        links = shared_adjacency.get(node)
+        if links is None:
+            return default
+        record = self.db.record
+        return {other_node: slot for other_node, slot in links.items() if record(slot) is not None}
+
+
+class Shared_Field:
+    # costs[slot] / seqs[slot] of a Shared_LSDB
+    __slots__ = ('db', 'field')
+
+    def __init__(self, db, field):
+        self.db = db
+        self.field = field
+
+    def __getitem__(self, slot):
+        return self.db.record(slot)[self.field]
+
+
+class Shared_Ranks:
+    # node_index of a Shared_LSDB, only what full_spf uses of it
+    __slots__ = ('db',)
+
+    def __init__(self, db):
+        self.db = db
+
+    def get(self, node, default=None):
+        index = shared_node_index.get(node)
+        ranks = self.db.ranks
+        if index is None or index >= len(ranks) or ranks[index] == UNRANKED:
+            return default
+        return ranks[index]
+
+    def __len__(self):
+        return self.db.rank_count
+
+
+class Shared_LSDB:
+    # same interface as LSDB, slots handed out (slot(), adjacency) are global
+    __slots__ = ('chunks', 'ranks', 'rank_count', 'order', 'own_slots', 'free_slots', 'link_count',
+                 'adjacency', 'costs', 'seqs', 'node_index')
+
+    def __init__(self):
+        # RECORDS
+        # chunks[slot >> CHUNK_BITS][slot % CHUNK] : (cost, seq) of a global slot, None if not held
+        self.chunks = []
+
+        # TIE RANKS
+        # ranks[shared interned index] : rank of that node here, UNRANKED if never seen
+        self.ranks = array('i')
+        self.rank_count = 0
+
+        # SLOT ORDER (what an LSDB's own slots would be)
+        # order[own slot] : 2 * global slot + 1 if stored as (node2, node1), FREE_SLOT if unused
+        # own_slots[global slot] : own slot of that link, FREE_SLOT if not held
+        self.order = array('i')
+        self.own_slots = array('i')
+        self.free_slots = []
+        self.link_count = 0
+
+        self.adjacency = Shared_Adjacency(self)
+        self.costs = Shared_Field(self, 0)
+        self.seqs = Shared_Field(self, 1)
+        self.node_index = Shared_Ranks(self)
+
+    def __del__(self):
+        for chunk in self.chunks:
+            for record in chunk:
+                if record is not None:
+                    release_record(record)
+            release_chunk(chunk)
+
+    def __len__(self):
+        return self.link_count
+
+    def __contains__(self, link):
+        node1, node2 = link
+        return self.slot(node1, node2) is not None
+
+    def __str__(self):
+        # as LSDB.__str__
+        return str({frozenset((node1, node2)): cost for node1, node2, cost, seq in self.items()})
+
+    def rank(self, node):
+        index = shared_intern(node)
+        ranks = self.ranks
+        if index >= len(ranks):
+            ranks.extend(array('i', [UNRANKED]) * (index + 1 - len(ranks)))
+        if ranks[index] == UNRANKED:
+            ranks[index] = self.rank_count
+            self.rank_count += 1
+
+    def record(self, slot):
+        chunk = slot >> CHUNK_BITS
+        if chunk >= len(self.chunks):
+            return None
+        return self.chunks[chunk][slot & (CHUNK - 1)]
+
+    def write(self, slot, record):
+        index = slot >> CHUNK_BITS
+        if index >= len(self.chunks):
+            self.chunks.extend([EMPTY_CHUNK] * (index + 1 - len(self.chunks)))
+        old_chunk = self.chunks[index]
+        content = list(old_chunk)
+        content[slot & (CHUNK - 1)] = record
+        self.chunks[index] = share_chunk(tuple(content))
+        release_chunk(old_chunk)
+
+    def slot(self, node1, node2):
+        # None if there is no such link
+        slot = shared_adjacency.get(node1, {}).get(node2)
+        if slot is None or self.record(slot) is None:
+            return None
+        return slot
+
+    def get_cost(self, node1, node2):
+        slot = self.slot(node1, node2)
+        return None if slot is None else self.record(slot)[0]
+
+    def get_seq(self, node1, node2):
+        slot = self.slot(node1, node2)
+        return None if slot is None else self.record(slot)[1]
+
+    def set(self, node1, node2, cost, seq):
+        # stores (or overwrites) a link, returns its previous cost or None if new
+        slot = shared_slot(node1, node2)
+        old = self.record(slot)
+        self.write(slot, share_record(cost, seq))
+        if old is not None:
+            release_record(old)
+            return old[0]
+
+        self.rank(node1)
+        self.rank(node2)
+        code = 2 * slot + (shared_ends[2 * slot] != shared_node_index[node1])
+        if self.free_slots:
+            own_slot = self.free_slots.pop()
+            self.order[own_slot] = code
+        else:
+            own_slot = len(self.order)
+            self.order.append(code)
+        own_slots = self.own_slots
+        if slot >= len(own_slots):
+            own_slots.extend(array('i', [FREE_SLOT]) * (slot + 1 - len(own_slots)))
+        own_slots[slot] = own_slot
+        self.link_count += 1
+        return None
+
+    def remove(self, node1, node2):
+        # forgets a link, returns its old cost
+        slot = shared_adjacency[node1][node2]
+        old = self.record(slot)
+        self.write(slot, None)
+        release_record(old)
+
+        own_slot = self.own_slots[slot]
+        self.own_slots[slot] = FREE_SLOT
+        self.order[own_slot] = FREE_SLOT
+        self.free_slots.append(own_slot)
+        self.link_count -= 1
+        return old[0]
+
+    def items(self):
+        # yields (node1, node2, cost, seq) for every link held
+        for code in self.order:
+            if code != FREE_SLOT:
+                slot = code >> 1
+                node1, node2 = shared_node_ids[shared_ends[2 * slot]], shared_node_ids[shared_ends[2 * slot + 1]]
+                if code & 1:
+                    node1, node2 = node2, node1
+                cost, seq = self.record(slot)
+                yield node1, node2, cost, seq
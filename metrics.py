@@ -0,0 +1,155 @@
+import json
+import time
+
+import codec
+from distance_vector_node import Distance_Vector_Node
+from link_state_node import Link_State_Node
+
+# --------------------------------------------------------------------------------
+# PER NODE METRICS (opt-in, see --metrics in sim.py)
+
+# enable() wraps the interesting methods of both node classes, nothing is
+# wrapped (and nothing is counted) until it is called, so a normal run pays
+# nothing at all. once enabled, every node gets a Node_Metrics with:
+
+# sent / received : {kind : [messages, bytes]}, kind as in codec.py
+# calls : {method : [calls, seconds]} for the route computations in TIMED,
+#         seconds include whatever timed methods they call themselves
+# lsas : what became of every LSA (or LSB entry) a link state node got, see
+#        Link_State_Node.process_lsa
+
+# report() adds the table sizes of every node still in the topology and sums
+# everything up network wide
+# --------------------------------------------------------------------------------
+
+TIMED = {
+    Link_State_Node: ('full_spf', 'spt_link_changed', 'build_routing_table'),
+    Distance_Vector_Node: ('full_dv', 'update_own_dv', 'recompute_own_dv'),
+}
+
+enabled = False
+# where Sim writes the report at the end of the run
+report_file = None
+
+# {node id : Node_Metrics}
+nodes = {}
+
+
+class Node_Metrics:
+
+    def __init__(self):
+        self.sent = {}
+        self.received = {}
+        self.calls = {}
+        self.lsas = {'accepted': 0, 'ignored': 0, 'stale': 0}
+
+    def to_json(self):
+        return {'sent': self.sent, 'received': self.received, 'calls': self.calls, 'lsas': self.lsas}
+
+
+def of(node):
+    metrics = nodes.get(node.id)
+    if metrics is None:
+        metrics = nodes[node.id] = Node_Metrics()
+    return metrics
+
+
+def count(counts, key, size):
+    entry = counts.setdefault(key, [0, 0])
+    entry[0] += 1
+    entry[1] += size
+
+
+# WRAPPERS -----------------------------------------------------------------------
+
+def counting_send(send):
+    def wrapper(node, neighbor, m):
+        count(of(node).sent, codec.active.kind(m), len(m))
+        return send(node, neighbor, m)
+    return wrapper
+
+
+def counting_receive(receive):
+    def wrapper(node, m):
+        count(of(node).received, codec.active.kind(m), len(m))
+        return receive(node, m)
+    return wrapper
+
+
+def counting_lsa(process_lsa):
+    def wrapper(node, *args):
+        outcome = process_lsa(node, *args)
+        of(node).lsas[outcome] += 1
+        return outcome
+    return wrapper
+
+
+def timed(name, method):
+    def wrapper(node, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(node, *args, **kwargs)
+        finally:
+            entry = of(node).calls.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+    return wrapper
+
+
+def enable(output=None):
+    global enabled, report_file
+    report_file = output
+    if enabled:
+        return
+    enabled = True
+    for node_class, names in TIMED.items():
+        node_class.send_to_neighbor = counting_send(node_class.send_to_neighbor)
+        node_class.process_incoming_routing_message = counting_receive(node_class.process_incoming_routing_message)
+        for name in names:
+            setattr(node_class, name, timed(name, getattr(node_class, name)))
+    Link_State_Node.process_lsa = counting_lsa(Link_State_Node.process_lsa)
+
+
+# REPORT -------------------------------------------------------------------------
+
+def table_sizes(node):
+    if isinstance(node, Link_State_Node):
+        sizes = {'links': len(node.lsdb), 'routes': len(node.next_hops), 'known_nodes': len(node.known_nodes)}
+        if node.AREAS:
+            # a border router's backbone links count too
+            sizes['links'] += len(node.backbone) if node.backbone is not None else 0
+            sizes['summaries'] = sum(len(held) for held in node.summaries.values())
+        return sizes
+    if isinstance(node, Distance_Vector_Node):
+        return {'routes': len(node.dv), 'neighbor_entries': sum(len(v[0]) for v in node.neighbors.values())}
+    return {}
+
+
+def add_up(total, counts):
+    for key, (calls, amount) in counts.items():
+        entry = total.setdefault(key, [0, 0])
+        entry[0] += calls
+        entry[1] += amount
+
+
+def report(topology):
+    # {'network' : totals, 'nodes' : {node id : metrics}} of a finished run
+    per_node = {}
+    network = {'sent': {}, 'received': {}, 'calls': {}, 'lsas': {'accepted': 0, 'ignored': 0, 'stale': 0}, 'tables': {}}
+    for node_id in sorted(set(nodes) | set(topology.nodes)):
+        metrics = nodes.get(node_id, Node_Metrics())
+        entry = per_node[node_id] = metrics.to_json()
+        for key in ('sent', 'received', 'calls'):
+            add_up(network[key], getattr(metrics, key))
+        for outcome, n in metrics.lsas.items():
+            network['lsas'][outcome] += n
+        if node_id in topology.nodes:
+            entry['tables'] = table_sizes(topology.nodes[node_id])
+            for key, size in entry['tables'].items():
+                network['tables'][key] = network['tables'].get(key, 0) + size
+    return {'network': network, 'nodes': per_node}
+
+
+def write_report(topology):
+    with open(report_file, 'w') as f:
+        json.dump(report(topology), f, indent=1)
@@ -0,0 +1,398 @@
+import heapq
+import itertools
+import logging
+import multiprocessing
+import os
+import sys
+import traceback
+
+import codec
+import sim
+import timers
+from distance_vector_node import Distance_Vector_Node
+from link_state_node import Link_State_Node
+from simulator.config import *
+from simulator.event_queue import Event_Queue
+from simulator.node import Node
+from simulator.topology import Get_Time
+
+# --------------------------------------------------------------------------------
+# PARTITIONED PARALLEL SIMULATION
+
+# every node lives in one of N worker processes (node id % N). the simulator
+# itself (topology, event queue, message delivery) stays in this process, but
+# the node objects it holds here are shells: link_has_been_updated and
+# process_incoming_routing_message only queue a run for the owning worker.
+# once everything due at the current time has been dispatched, the queued runs
+# go out in one batch per worker, all workers handle theirs at the same time,
+# and what the nodes sent comes back and is handed to the simulator.
+
+# the result is the same as a serial run (sim.py), message for message: every
+# run gets a number in the order the serial run would have made it, and
+# whatever a run sends, registers (timers.at_end_of_instant / after) or
+# cancels is put back in that order, so the event queue sees the very same
+# posts in the very same order. what decides the order is the same as in
+# Sim.dispatch_event: the end of instant callbacks of the whole network run
+# once everything at the current time has been dispatched, timers go off one
+# at a time in (due, registration) order. events from the event file (link
+# changes, DRAW_PATH...) first wait for every run queued before them, the
+# runs they cause happen right away (one by one, they are few), and
+# get_next_hop / str() of a node ask its worker.
+
+# links of cost 0 are not supported: a message over one arrives in the
+# instant it was sent, and here it is only sent once the instant is over
+# --------------------------------------------------------------------------------
+
+USAGE_STR = "Usage: python parallel_sim.py ALGORITHM EVENT_FILE [--workers=N] (plus any sim.py option but --metrics, --profile, checkpoints and --events)\n"
+
+NODE_CLASSES = {'DISTANCE_VECTOR': Distance_Vector_Node, 'LINK_STATE': Link_State_Node}
+
+# the Parallel_Sim driving the shells of this process
+coordinator = None
+
+
+# WORKER -------------------------------------------------------------------------
+
+class Worker:
+    # the real nodes of one partition, in their own process. requests:
+    # ('run', time, [(run_id, node_id, method, args)]), a callback is
+    #     (run_id, None, None, handle)
+    #     replies (sends, registrations, cancels), see run
+    # ('call', node_id, method, args)    replies what the method returned
+    # ('stats',)                         replies codec.active.stats
+    # ('stop',)
+
+    def __init__(self, algorithm, conn):
+        self.node_class = NODE_CLASSES[algorithm]
+        self.conn = conn
+        self.nodes = {}
+        # CALLBACKS (end of instant and timers), {handle : callback}
+        self.callbacks = {}
+        self.handles = itertools.count()
+
+        # what the current batch did, see run
+        self.run_id = None
+        self.registered = 0
+        self.sends = []
+        self.registrations = []
+        self.cancels = []
+
+        worker = self
+        Node.send_to_neighbor = lambda node, neighbor, m: worker.sends.append((worker.run_id, node.id, neighbor, m))
+        timers.at_end_of_instant = lambda callback: worker.register(callback, None)
+        timers.after = lambda delay, callback: worker.register(callback, Get_Time() + delay)
+        timers.cancel = self.cancel
+
+    def node(self, node_id):
+        node = self.nodes.get(node_id)
+        if node is None:
+            node = self.nodes[node_id] = self.node_class(node_id)
+        return node
+
+    def register(self, callback, due):
+        # due is None for an end of instant callback
+        handle = next(self.handles)
+        self.callbacks[handle] = callback
+        self.registrations.append((self.run_id, self.registered, due, handle))
+        self.registered += 1
+        return handle
+
+    def cancel(self, handle):
+        if self.callbacks.pop(handle, None) is not None:
+            self.cancels.append(handle)
+
+    def run(self, time, runs):
+        # sends : [(run_id, src, dst, m)]
+        # registrations : [(run_id, nth registration of that run, due, handle)]
+        # cancels : [handle]
+        Event_Queue.Current_Time = time
+        self.sends, self.registrations, self.cancels = [], [], []
+        for self.run_id, node_id, method, args in runs:
+            self.registered = 0
+            if method is None:
+                self.callbacks.pop(args)()
+            else:
+                getattr(self.node(node_id), method)(*args)
+        return self.sends, self.registrations, self.cancels
+
+    def serve(self):
+        while True:
+            request = self.conn.recv()
+            try:
+                if request[0] == 'run':
+                    reply = self.run(*request[1:])
+                elif request[0] == 'call':
+                    node_id, method, args = request[1:]
+                    reply = getattr(self.node(node_id), method)(*args)
+                elif request[0] == 'stats':
+                    reply = codec.active.stats
+                else:
+                    return
+            except Exception:
+                self.conn.send(('error', traceback.format_exc()))
+                continue
+            self.conn.send(('ok', reply))
+
+
+def run_worker(algorithm, event_file, options, conn):
+    # stdout goes wherever the parent's goes, the nodes print "lost connection"s
+    sim.configure(options)
+    sim.use_areas(event_file)
+    Worker(algorithm, conn).serve()
+
+
+# COORDINATOR --------------------------------------------------------------------
+
+def deferred(method):
+    def run_later(node, *args):
+        coordinator.shells[node.id] = node
+        coordinator.pending.append((coordinator.owner(node.id), (next(coordinator.run_ids), node.id, method, args)))
+        if coordinator.scripted:
+            # one event can change several links (DELETE_NODE), what a node
+            # sends has to go out before the next one changes
+            coordinator.run_pending()
+    return run_later
+
+
+def remote(method):
+    def call(node, *args):
+        return coordinator.call(node.id, method, args)
+    return call
+
+
+class Parallel_Sim(sim.Sim):
+
+    def __init__(self, algorithm, event_file, workers, options):
+        global coordinator
+        coordinator = self
+
+        context = multiprocessing.get_context('spawn')
+        self.conns = []
+        for _ in range(workers):
+            conn, child_conn = context.Pipe()
+            context.Process(target=run_worker, args=(algorithm, event_file, options, child_conn), daemon=True).start()
+            child_conn.close()
+            self.conns.append(conn)
+
+        node_class = NODE_CLASSES[algorithm]
+        for method in ('link_has_been_updated', 'process_incoming_routing_message'):
+            setattr(node_class, method, deferred(method))
+        for method in ('get_next_hop', '__str__'):
+            setattr(node_class, method, remote(method))
+
+        # {node id : shell node}, what sends are replayed from
+        self.shells = {}
+        # RUNS
+        # pending : [(worker, run)] not handed to a worker yet, see execute
+        # end_of_instant : [(run_id, nth registration, worker, handle)] registered so far
+        # scripted is set while an event from the event file is dispatched
+        self.run_ids = itertools.count()
+        self.pending = []
+        self.scripted = False
+        self.end_of_instant = []
+
+        # TIMERS, as in timers.py
+        # timer_heap : [due, order, (worker, handle)], (worker, handle) is None once cancelled
+        # live_timers : {(worker, handle) : its heap entry}
+        self.timer_heap = []
+        self.timer_order = itertools.count()
+        self.live_timers = {}
+
+        # EVENT ORDER
+        # arrivals : ids of the events posted for replayed sends (everything
+        # else came from the event file), held : events taken off the queue
+        # too early, as (time, order, event), see next_event. taken is the
+        # (time, order) of the last event next_event returned
+        self.arrivals = set()
+        self.held = []
+        self.hold_order = itertools.count()
+        self.taken = None
+
+        super().__init__(algorithm, event_file)
+
+    def close(self):
+        for conn in self.conns:
+            conn.send(('stop',))
+            conn.close()
+
+    # WORKERS ----------------------------------------------------------------
+
+    def owner(self, node_id):
+        return node_id % len(self.conns)
+
+    def receive(self, worker):
+        try:
+            status, reply = self.conns[worker].recv()
+        except (EOFError, OSError):
+            raise RuntimeError(f"worker {worker} died")
+        if status == 'error':
+            raise RuntimeError(f"worker {worker} failed:\n{reply}")
+        return reply
+
+    def call(self, node_id, method, args):
+        worker = self.owner(node_id)
+        self.conns[worker].send(('call', node_id, method, args))
+        return self.receive(worker)
+
+    def execute(self, runs):
+        # runs : [(worker, (run_id, node_id, method, args))] in run order, a
+        # callback is (run_id, None, None, handle). each worker gets its share
+        # and all of them work at once
+        batches = {}
+        for worker, run in runs:
+            batches.setdefault(worker, []).append(run)
+        for worker, batch in batches.items():
+            self.conns[worker].send(('run', Get_Time(), batch))
+
+        sends = []
+        registrations = []
+        cancels = []
+        for worker in batches:
+            worker_sends, worker_registrations, worker_cancels = self.receive(worker)
+            # every worker's sends are in run order already
+            sends.append(worker_sends)
+            registrations += [(run_id, n, worker, due, handle) for run_id, n, due, handle in worker_registrations]
+            cancels += [(worker, handle) for handle in worker_cancels]
+
+        # in the order the serial run registers them
+        for run_id, n, worker, due, handle in sorted(registrations):
+            if due is None:
+                self.end_of_instant.append((run_id, n, worker, handle))
+            else:
+                timer = [due, next(self.timer_order), (worker, handle)]
+                heapq.heappush(self.timer_heap, timer)
+                self.live_timers[(worker, handle)] = timer
+        # (a timer may be cancelled in the very batch that set it)
+        for key in cancels:
+            timer = self.live_timers.pop(key, None)
+            if timer is not None:
+                timer[2] = None
+
+        self.replay(heapq.merge(*sends, key=lambda send: send[0]))
+
+    def replay(self, sends):
+        # hands what the nodes sent to the simulator, noting which events that posts
+        post = Event_Queue.Post
+
+        def post_arrival(e):
+            self.arrivals.add(id(e))
+            post(e)
+
+        Event_Queue.Post = post_arrival
+        try:
+            for run_id, src, dst, m in sends:
+                Node.send_to_neighbor(self.shells[src], dst, m)
+        finally:
+            Event_Queue.Post = post
+
+    def run_pending(self):
+        runs, self.pending = self.pending, []
+        if runs:
+            self.execute(runs)
+
+    def run_end_of_instant(self):
+        # callbacks may register more callbacks, keep going until none are left
+        while self.end_of_instant:
+            callbacks = sorted(self.end_of_instant)
+            self.end_of_instant = []
+            self.execute([(worker, (next(self.run_ids), None, None, handle)) for run_id, n, worker, handle in callbacks])
+
+    # TIMERS -----------------------------------------------------------------
+
+    def next_due(self):
+        while self.timer_heap and self.timer_heap[0][2] is None:
+            heapq.heappop(self.timer_heap)
+        return self.timer_heap[0][0] if self.timer_heap else None
+
+    def run_next_timer(self):
+        # the clock must already be at next_due()
+        due, order, (worker, handle) = heapq.heappop(self.timer_heap)
+        del self.live_timers[(worker, handle)]
+        self.execute([(worker, (next(self.run_ids), None, None, handle))])
+
+    # EVENT LOOP -------------------------------------------------------------
+
+    def next_event(self):
+        # the next event as the serial run would see it. a held event was at
+        # the head of the queue when it was taken off, so it goes before
+        # anything queued for the same time (and keeps its place among the
+        # held ones, however often it is held again)
+        e = Event_Queue.Get_Earliest()
+        if e:
+            self.taken = (e.time_stamp, next(self.hold_order))
+        if self.held and (e is None or self.held[0][0] <= e.time_stamp):
+            if e:
+                heapq.heappush(self.held, self.taken + (e,))
+            time, order, e = heapq.heappop(self.held)
+            self.taken = (time, order)
+        return e
+
+    def hold(self, e):
+        # e is what next_event returned last
+        heapq.heappush(self.held, self.taken + (e,))
+
+    def dispatch_event(self, step='NORMAL'):
+        # Sim.dispatch_event with the node runs batched per instant
+        e = self.next_event()
+        while e or self.next_due() is not None:
+            due = self.next_due()
+            if due is not None and (e is None or due < e.time_stamp):
+                if e:
+                    self.hold(e)
+                Event_Queue.Current_Time = due
+                self.run_next_timer()
+                self.run_end_of_instant()
+                e = self.next_event()
+                continue
+
+            if id(e) in self.arrivals:
+                self.arrivals.discard(id(e))
+                e.dispatch()
+            else:
+                # from the event file: everything before it has to have
+                # happened, and the node runs it makes happen right away
+                self.run_pending()
+                self.scripted = True
+                e.dispatch()
+                self.scripted = False
+
+            e = self.next_event()
+            if e is None or e.time_stamp > Get_Time():
+                # the runs queued at this time may send something that
+                # arrives before e (or at this very time)
+                if e:
+                    self.hold(e)
+                self.run_pending()
+                e = self.next_event()
+                if self.end_of_instant and (e is None or e.time_stamp > Get_Time()):
+                    if e:
+                        self.hold(e)
+                    self.run_end_of_instant()
+                    e = self.next_event()
+
+        # what the workers' nodes sent, for the totals Sim logs
+        for worker, conn in enumerate(self.conns):
+            conn.send(('stats',))
+            for kind, (count, size) in self.receive(worker).items():
+                entry = codec.active.stats.setdefault(kind, [0, 0])
+                entry[0] += count
+                entry[1] += size
+
+
+def main():
+    options, argv = sim.parse_args(sys.argv)
+    workers = options.pop('workers', str(os.cpu_count() or 1))
+
+    if len(argv) != 3 or argv[1] not in NODE_CLASSES or not workers.isdigit() or int(workers) < 1 \
+            or any(name in options for name in ('metrics', 'profile', 'checkpoint', 'warm-start', 'events')):
+        sys.stderr.write(USAGE_STR + sim.OPTIONS_USAGE_STR)
+        sys.exit(-1)
+    sim.configure(options)
+
+    s = Parallel_Sim(argv[1], argv[2], int(workers), options)
+    s.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format=LOGGING_FORMAT, datefmt=LOGGING_DATAFMT)
+    main()
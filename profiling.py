@@ -0,0 +1,347 @@
+import cProfile
+import io
+import os
+import pstats
+import signal
+import time
+import tracemalloc
+from collections import Counter
+
+from distance_vector_node import Distance_Vector_Node
+from link_state_node import Link_State_Node
+
+# --------------------------------------------------------------------------------
+# PROFILING (opt-in, see --profile in sim.py)
+
+# profiles a whole Sim run, from loading the event file to the last event,
+# with one of
+# CPROFILE  every call counted (cProfile), the run gets a few times slower
+# SAMPLE    the stack is sampled every SAMPLE_INTERVAL of cpu time (a SIGPROF
+#           timer, unix only), close to free
+# and/or
+# MEMORY    tracemalloc, keeping SNAPSHOT_FRAMES frames of every allocation.
+#           the run gets ~20 times slower at 8 frames (and ~4 at 1), enough
+#           to reach back to the callback for the allocations under them
+
+# whatever is on, the routing callbacks (CALLBACKS) are timed on their own too:
+# calls and seconds spent in them, plus with MEMORY the bytes they allocated
+# (net, what they freed again taken off) and the bytes still held at the end
+# that they allocated. nested callbacks count in both (get_next_hop running
+# full_spf). at the end of the run finish() writes, for --profile-out=PREFIX:
+
+# PREFIX.txt            the report: callbacks, hot paths, hottest functions
+#                       and, with MEMORY, the top allocation sites
+# PREFIX.folded         collapsed stacks ("frame;frame;frame weight") for
+#                       flamegraph.pl, inferno or speedscope: samples, or
+#                       with CPROFILE microseconds, estimated from the call
+#                       graph (cProfile keeps callers, not whole stacks)
+# PREFIX.pstats         CPROFILE: the raw data, for pstats or snakeviz
+# PREFIX.tracemalloc    MEMORY: the snapshot at the end of the run, for
+#                       tracemalloc.Snapshot.load (compare two runs with it)
+# PREFIX.memory.folded  MEMORY: bytes still held at the end, by allocation stack
+# --------------------------------------------------------------------------------
+
+# full_spf is what dijkstra() and every routing table rebuild of a link
+# state node run on
+CALLBACKS = {
+    Link_State_Node: ('link_has_been_updated', 'process_incoming_routing_message', 'get_next_hop', 'dijkstra', 'full_spf'),
+    Distance_Vector_Node: ('link_has_been_updated', 'process_incoming_routing_message', 'get_next_hop', 'recompute_own_dv'),
+}
+
+MODES = ('CPROFILE', 'SAMPLE', 'MEMORY')
+
+SAMPLE_INTERVAL = 0.001
+SNAPSHOT_FRAMES = 8
+
+# lines of every table in the report
+SHOWN = 25
+
+# stacks (CPROFILE) and allocation stacks under this share of the total are
+# left out of the folded files
+SMALLEST = 0.0001
+
+sampling_available = hasattr(signal, 'setitimer') and hasattr(signal, 'SIGPROF')
+
+enabled = False
+# set by enable(): CPROFILE, SAMPLE or None
+mode = None
+memory = False
+prefix = None
+# the cProfile.Profile of the run
+profiler = None
+
+# {'Class.method' : [calls, seconds, net bytes allocated]}
+callbacks = {}
+# {'Class.method' : (filename, first line, last line)} of the unwrapped methods
+callback_lines = {}
+
+# SAMPLE : {(code, code, ...) outermost first : samples}
+samples = Counter()
+
+started = None
+
+
+# CALLBACK WRAPPERS --------------------------------------------------------------
+
+def timed(name, method):
+    entry = callbacks.setdefault(name, [0, 0.0, 0])
+
+    def wrapper(node, *args, **kwargs):
+        start = time.perf_counter()
+        held = tracemalloc.get_traced_memory()[0]
+        try:
+            return method(node, *args, **kwargs)
+        finally:
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+            entry[2] += tracemalloc.get_traced_memory()[0] - held
+    return wrapper
+
+
+def enable(modes, output='profile'):
+    # modes : a list of MODES, at most one of CPROFILE / SAMPLE
+    global enabled, mode, memory, prefix
+    mode = 'CPROFILE' if 'CPROFILE' in modes else 'SAMPLE' if 'SAMPLE' in modes else None
+    memory = 'MEMORY' in modes
+    prefix = output
+    if enabled:
+        return
+    enabled = True
+    for node_class, names in CALLBACKS.items():
+        for name in names:
+            method = getattr(node_class, name)
+            code = method.__code__
+            label = f"{node_class.__name__}.{name}"
+            callback_lines[label] = (code.co_filename, code.co_firstlineno, max(line for _, _, line in code.co_lines() if line))
+            setattr(node_class, name, timed(label, method))
+
+
+# SAMPLING -----------------------------------------------------------------------
+
+def sample(signum, frame):
+    stack = []
+    while frame is not None:
+        # the callback wrappers are left out, the callbacks are what matter
+        if frame.f_code.co_filename != __file__:
+            stack.append(frame.f_code)
+        frame = frame.f_back
+    stack.reverse()
+    samples[tuple(stack)] += 1
+
+
+def code_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+# CPROFILE CALL GRAPH ------------------------------------------------------------
+
+def func_label(func):
+    filename, line, name = func
+    if filename == '~':
+        # built in
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def call_graph_stacks(stats):
+    # {(label, ...) outermost first : microseconds}. every function's time
+    # is split among its callees by the time each of them spent called from
+    # it, what is left is its own. recursion stops at a function already on
+    # the stack (its time there stays with the caller)
+    children = {}
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((func, edge[3]))
+    total = sum(tt for cc, nc, tt, ct, callers in stats.values())
+    smallest = total * SMALLEST
+    stacks = Counter()
+
+    def walk(func, path, seconds):
+        cc, nc, tt, ct, callers = stats[func]
+        if func[0] != __file__:
+            path += (func_label(func),)
+        own = seconds * tt / ct if ct else seconds
+        for child, edge in children.get(func, ()):
+            share = min(seconds, seconds * edge / ct) if ct else 0
+            if func_label(child) in path or share < smallest:
+                own += share
+            else:
+                walk(child, path, share)
+        stacks[path] += own
+
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        if not any(caller in stats for caller in callers):
+            walk(func, (), ct)
+    return Counter({path: int(seconds * 1e6) for path, seconds in stacks.items() if seconds * 1e6 >= 1})
+
+
+# RUN ----------------------------------------------------------------------------
+
+def start():
+    global profiler, started
+    if memory:
+        tracemalloc.start(SNAPSHOT_FRAMES)
+    if mode == 'CPROFILE':
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif mode == 'SAMPLE':
+        signal.signal(signal.SIGPROF, sample)
+        signal.setitimer(signal.ITIMER_PROF, SAMPLE_INTERVAL, SAMPLE_INTERVAL)
+    started = time.perf_counter()
+
+
+def stop():
+    # returns the seconds the run took
+    elapsed = time.perf_counter() - started
+    if mode == 'CPROFILE':
+        profiler.disable()
+    elif mode == 'SAMPLE':
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+    return elapsed
+
+
+def finish(title):
+    # stops profiling and writes the files, returns their names
+    elapsed = stop()
+    snapshot = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+    if mode == 'CPROFILE':
+        stats = pstats.Stats(profiler)
+        stacks = call_graph_stacks(stats.stats)
+        unit = 'us'
+    elif mode == 'SAMPLE':
+        stats = None
+        stacks = Counter()
+        for stack, count in samples.items():
+            stacks[tuple(code_label(code) for code in stack)] += count
+        unit = 'samples'
+    else:
+        stats = None
+        stacks = Counter()
+        unit = None
+
+    out = io.StringIO()
+    modes = '+'.join(filter(None, [mode, 'MEMORY' if memory else None]))
+    out.write(f"PROFILE ({modes}) of {title}: {elapsed:.2f} s\n\n")
+    write_callbacks(out, elapsed, snapshot)
+    if stacks:
+        write_hot_paths(out, stacks, unit)
+    if stats is not None:
+        for key, heading in (('cumulative', 'cumulative time'), ('tottime', 'own time')):
+            out.write(f"FUNCTIONS BY {heading.upper()} (cProfile)\n")
+            stats.stream = out
+            stats.sort_stats(key).print_stats(SHOWN)
+    elif stacks:
+        write_sampled_functions(out, stacks)
+    if snapshot is not None:
+        write_memory(out, snapshot, peak)
+
+    files = [f"{prefix}.txt"]
+    with open(files[0], 'w') as f:
+        f.write(out.getvalue())
+    if stacks:
+        files.append(f"{prefix}.folded")
+        write_folded(files[-1], stacks)
+    if stats is not None:
+        files.append(f"{prefix}.pstats")
+        stats.dump_stats(files[-1])
+    if snapshot is not None:
+        files.append(f"{prefix}.tracemalloc")
+        snapshot.dump(files[-1])
+        files.append(f"{prefix}.memory.folded")
+        write_folded(files[-1], memory_stacks(snapshot))
+    return files
+
+
+# REPORT -------------------------------------------------------------------------
+
+def write_callbacks(out, elapsed, snapshot):
+    held = held_by_callback(snapshot) if snapshot is not None else {}
+    out.write("ROUTING CALLBACKS (nested callbacks count in both)\n")
+    header = f"{'CALLBACK':<50} {'CALLS':>10} {'SECONDS':>9} {'US/CALL':>9} {'% OF RUN':>8}"
+    if snapshot is not None:
+        header += f" {'NET KB':>10} {'HELD KB':>10}"
+    out.write(header + "\n")
+    for name, (calls, seconds, allocated) in sorted(callbacks.items(), key=lambda item: -item[1][1]):
+        if not calls:
+            continue
+        line = f"{name:<50} {calls:>10} {seconds:>9.3f} {seconds / calls * 1e6:>9.1f} {seconds / elapsed * 100:>8.1f}"
+        if snapshot is not None:
+            line += f" {allocated / 1024:>10.1f} {held.get(name, 0) / 1024:>10.1f}"
+        out.write(line + "\n")
+    out.write("\n")
+
+
+def write_hot_paths(out, stacks, unit):
+    # the heaviest stacks, from the outermost routing callback on them down,
+    # or if there is none, from below sim.py (the event loop)
+    total = sum(stacks.values())
+    names = {name.split('.')[1] for name in callbacks}
+    paths = Counter()
+    for stack, weight in stacks.items():
+        first = next((i for i, label in enumerate(stack) if label.split(' ')[0] in names), None)
+        if first is None:
+            first = max((i + 1 for i, label in enumerate(stack) if '(sim.py:' in label), default=0)
+        paths[stack[first:] or stack[-1:]] += weight
+    out.write(f"HOT PATHS ({unit}, % of all)\n")
+    for stack, weight in paths.most_common(SHOWN):
+        out.write(f"{weight:>12} {weight / total * 100:>6.1f}%  {' > '.join(stack)}\n")
+    out.write("\n")
+
+
+def write_sampled_functions(out, stacks):
+    total = sum(stacks.values())
+    own = Counter()
+    inclusive = Counter()
+    for stack, count in stacks.items():
+        own[stack[-1]] += count
+        for label in set(stack):
+            inclusive[label] += count
+    for heading, counts in (('OWN', own), ('INCLUSIVE', inclusive)):
+        out.write(f"FUNCTIONS BY {heading} SAMPLES ({total} samples, {SAMPLE_INTERVAL * 1000:g} ms each)\n")
+        for label, count in counts.most_common(SHOWN):
+            out.write(f"{count:>10} {count / total * 100:>6.1f}%  {label}\n")
+        out.write("\n")
+
+
+def held_by_callback(snapshot):
+    # {'Class.method' : bytes} still held at the end, by the outermost
+    # callback on the stack that allocated them
+    held = {}
+    for trace in snapshot.traces:
+        for frame in trace.traceback:
+            name = next((name for name, (filename, first, last) in callback_lines.items()
+                         if frame.filename == filename and first <= frame.lineno <= last), None)
+            if name is not None:
+                held[name] = held.get(name, 0) + trace.size
+                break
+    return held
+
+
+def write_memory(out, snapshot, peak):
+    statistics = snapshot.statistics('lineno')
+    out.write(f"MEMORY (tracemalloc): peak {peak / 1024 / 1024:.1f} MB, held at the end {sum(s.size for s in statistics) / 1024 / 1024:.1f} MB\n")
+    out.write(f"{'KB':>12} {'BLOCKS':>10}  ALLOCATED AT\n")
+    for statistic in statistics[:SHOWN]:
+        frame = statistic.traceback[0]
+        out.write(f"{statistic.size / 1024:>12.1f} {statistic.count:>10}  {frame.filename}:{frame.lineno}\n")
+    out.write("\n")
+
+
+def memory_stacks(snapshot):
+    stacks = Counter()
+    for trace in snapshot.traces:
+        stacks[tuple(f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in trace.traceback)] += trace.size
+    total = sum(stacks.values())
+    return Counter({stack: size for stack, size in stacks.items() if size >= total * SMALLEST})
+
+
+def write_folded(filename, stacks):
+    with open(filename, 'w') as f:
+        for stack, weight in sorted(stacks.items()):
+            f.write(f"{';'.join(label.replace(';', ',') for label in stack)} {weight}\n")
@@ -1,6 +1,16 @@
+import heapq
 import sys
 import logging
 
+import checkpoint
+import codec
+import dv_engine
+import event_stream
+import metrics
+import profiling
+import timers
+from distance_vector_node import Distance_Vector_Node
+from link_state_node import Link_State_Node
 from simulator.config import *
 from simulator.topology import Topology, Get_Time
 from simulator.event_queue import Event_Queue
@@ -10,10 +20,30 @@ class Sim(Topology):
 
     def __init__(self, algorithm, event_file, step='NORMAL'):
         super().__init__(algorithm, step)
-        self.load_command_file(event_file)
+        # events taken off the queue and put back, see next_event
+        self.held = []
+        self.taken = None
+        self.taken_count = 0
+        use_areas(event_file)
+        if profiling.enabled:
+            profiling.start()
+        if checkpoint.warm_start:
+            checkpoint.restore(self, algorithm, event_file)
+        elif checkpoint.at is not None:
+            checkpoint.load_events(self, algorithm, event_file)
+        elif event_stream.enabled:
+            event_stream.active = event_stream.Event_Stream(event_file, event_stream.window)
+        else:
+            self.load_command_file(event_file)
         self.dump_sim()
         self.dispatch_event(self.step)
+        if profiling.enabled:
+            self.logging.info("Profile written to %s" % ', '.join(profiling.finish(f"{algorithm} {event_file}")))
         self.logging.info("Total messages sent: %d" % self.message_count)
+        for kind, (count, size) in sorted(codec.active.stats.items()):
+            self.logging.info("%s messages (%s codec): %d, %d bytes" % (kind, codec.active.name, count, size))
+        if metrics.enabled:
+            metrics.write_report(self)
 
     def __str__(self):
         ans = "==== Print Topology ====\n"
@@ -25,33 +55,226 @@ class Sim(Topology):
     def dump_sim(self):
         self.logging.info("DUMP_SIM at Time %d\n" % Get_Time() + str(self))
 
-    def dispatch_event(self, step='NORMAL'):
+    def next_event(self):
+        # Event_Queue.Get_Earliest, but a held event (see hold) goes first. it
+        # was at the head of the queue when it was taken off, so it goes before
+        # anything queued for the same time since (and keeps its place among
+        # the held ones). when streaming the event file the next events of it
+        # are posted once nothing is left
         e = Event_Queue.Get_Earliest()
-        while e:
+        if e is None and not self.held and event_stream.active is not None and event_stream.active.feed_next():
+            e = Event_Queue.Get_Earliest()
+        if e:
+            self.taken_count += 1
+            self.taken = (e.time_stamp, self.taken_count)
+        if self.held and (e is None or self.held[0][0] <= e.time_stamp):
+            if e:
+                heapq.heappush(self.held, self.taken + (e,))
+            time, order, e = heapq.heappop(self.held)
+            self.taken = (time, order)
+        return e
+
+    def hold(self, e):
+        # puts back e, what next_event returned last. posting it again would
+        # put it behind everything queued for its time
+        heapq.heappush(self.held, self.taken + (e,))
+
+    def dispatch_event(self, step='NORMAL'):
+        timers.driving = True
+        e = self.next_event()
+        while e or timers.next_due() is not None:
+            due = timers.next_due()
+            if e and event_stream.active is not None:
+                # whatever runs next (by e's time) may send, the file events it
+                # could land with or before must be posted first (see event_stream.py)
+                event_stream.active.feed(e.time_stamp)
+            if checkpoint.due(e, due):
+                # everything up to the checkpoint time has run
+                e = checkpoint.save(self, e)
+                continue
+            if due is not None and (e is None or due < e.time_stamp):
+                # a timer goes off before the next event, move the clock to
+                # it. whatever it sends may land before e, put e back first
+                if e:
+                    self.hold(e)
+                Event_Queue.Current_Time = due
+                timers.run_next()
+                timers.run_end_of_instant()
+                e = self.next_event()
+                continue
+
             e.dispatch()
             if step == 'SINGLE_STEP':
                 self.logging.info(str(e))
                 self.wait()
-            e = Event_Queue.Get_Earliest()
+            e = self.next_event()
+            if timers.end_of_instant and (e is None or e.time_stamp > Get_Time()):
+                # everything at this time has run, whatever the end of instant
+                # callbacks send may still land before e, so put it back first
+                if e:
+                    self.hold(e)
+                timers.run_end_of_instant()
+                e = self.next_event()
+        if checkpoint.at is not None:
+            # the run ended before the checkpoint time
+            checkpoint.save(self, None)
+        timers.driving = False
 
     def print_comment(self, comment):
         self.logging.info('Time: %d, Comment: %s' % (Get_Time(), comment))
 
 
+# AREAS --------------------------------------------------------------------------
+# an event file puts link state nodes in OSPF style areas (see
+# Link_State_Node.AREAS) with comment lines, which the simulator skips:
+#   # AREA 1 10 11 12 20-29
+# puts nodes 10, 11, 12 and 20 to 29 in area 1. nodes not listed are in area
+# 0, the backbone
+
+def read_areas(event_file):
+    # {node : area} of every AREA line in the file
+    areas = {}
+    for line in open(event_file):
+        fields = line.split()
+        if len(fields) < 3 or fields[0] != '#' or fields[1] != 'AREA':
+            continue
+        area = int(fields[2])
+        for field in fields[3:]:
+            first, _, last = field.partition('-')
+            for node in range(int(first), int(last or first) + 1):
+                areas[node] = area
+    return areas
+
+
+def use_areas(event_file):
+    # before any node is made
+    Link_State_Node.AREAS = read_areas(event_file) if Link_State_Node.AREA_LINES else {}
+
+
+OPTIONS_USAGE_STR = "Options: --codec=TEXT|BINARY (wire format of routing messages, default TEXT)\n" \
+                    "         --dv-table=PATHS|COMPACT (distance vector storage, default PATHS)\n" \
+                    "         --dv-engine=PYTHON|NUMPY (distance vector route selection, default PYTHON)\n" \
+                    "         --dv-pacing=TIME (hold distance vector changes back for TIME, default 0)\n" \
+                    "         --dv-infinity=COST (distance vector routes costing COST or more are unreachable, default none)\n" \
+                    "         --ls-db=PRIVATE|SHARED (link state database per node or shared by all, default PRIVATE)\n" \
+                    "         --ls-areas=ON|OFF (follow the AREA lines of the event file, default ON)\n" \
+                    "         --ls-summary-delay=TIME (hold area border router summaries back for TIME, default 100)\n" \
+                    "         --metrics=FILE (write per node and network wide metrics to FILE as json, default off)\n" \
+                    "         --profile=CPROFILE|SAMPLE|MEMORY[,MEMORY] (profile the run, see profiling.py, default off)\n" \
+                    "         --profile-out=PREFIX (file names of the profile, default profile)\n" \
+                    "         --checkpoint=FILE --checkpoint-at=TIME (save the state of the run at TIME to FILE, default off)\n" \
+                    "         --warm-start=FILE (start from a checkpoint, skipping the events up to its time, default off)\n" \
+                    "         --events=LOAD|STREAM (load the event file up front or read it as the run goes, default LOAD)\n" \
+                    "         --event-window=N (STREAM: lines read ahead, the file must be in time order within them, default 10000)\n"
+
+
+def parse_args(args):
+    # --name=value options may appear anywhere, the rest are positional
+    options = dict(a[2:].partition('=')[::2] for a in args if a.startswith('--'))
+    return options, [a for a in args if not a.startswith('--')]
+
+
+def configure(options):
+    # applies the --name=value options (see OPTIONS_USAGE_STR), exits on a bad one
+    if options.get('codec', 'TEXT') not in codec.CODECS:
+        sys.stderr.write(USAGE_STR + OPTIONS_USAGE_STR)
+        sys.exit(-1)
+    codec.use(options.get('codec', 'TEXT'))
+
+    if options.get('dv-table', 'PATHS') not in ('PATHS', 'COMPACT'):
+        sys.stderr.write(USAGE_STR + OPTIONS_USAGE_STR)
+        sys.exit(-1)
+    Distance_Vector_Node.COMPACT_DV = options.get('dv-table', 'PATHS') == 'COMPACT'
+
+    if options.get('dv-engine', 'PYTHON') not in ('PYTHON', 'NUMPY'):
+        sys.stderr.write(USAGE_STR + OPTIONS_USAGE_STR)
+        sys.exit(-1)
+    if options.get('dv-engine') == 'NUMPY' and not dv_engine.available:
+        sys.stderr.write("--dv-engine=NUMPY needs numpy installed\n")
+        sys.exit(-1)
+    Distance_Vector_Node.NUMPY_DV = options.get('dv-engine') == 'NUMPY'
+
+    if not options.get('dv-pacing', '0').isdigit():
+        sys.stderr.write(USAGE_STR + OPTIONS_USAGE_STR)
+        sys.exit(-1)
+    Distance_Vector_Node.PACING_INTERVAL = int(options.get('dv-pacing', '0'))
+
+    if 'dv-infinity' in options:
+        if not options['dv-infinity'].isdigit() or int(options['dv-infinity']) < 1:
+            sys.stderr.write(USAGE_STR + OPTIONS_USAGE_STR)
+            sys.exit(-1)
+        Distance_Vector_Node.INFINITY = int(options['dv-infinity'])
+
+    if options.get('ls-db', 'PRIVATE') not in ('PRIVATE', 'SHARED'):
+        sys.stderr.write(USAGE_STR + OPTIONS_USAGE_STR)
+        sys.exit(-1)
+    Link_State_Node.SHARED_LSDB = options.get('ls-db') == 'SHARED'
+
+    if options.get('ls-areas', 'ON') not in ('ON', 'OFF'):
+        sys.stderr.write(USAGE_STR + OPTIONS_USAGE_STR)
+        sys.exit(-1)
+    Link_State_Node.AREA_LINES = options.get('ls-areas', 'ON') == 'ON'
+
+    if not options.get('ls-summary-delay', '100').isdigit():
+        sys.stderr.write(USAGE_STR + OPTIONS_USAGE_STR)
+        sys.exit(-1)
+    Link_State_Node.SUMMARY_DELAY = int(options.get('ls-summary-delay', '100'))
+
+    if 'metrics' in options:
+        if not options['metrics']:
+            sys.stderr.write(USAGE_STR + OPTIONS_USAGE_STR)
+            sys.exit(-1)
+        metrics.enable(options['metrics'])
+
+    if 'profile' in options:
+        modes = options['profile'].split(',')
+        if any(m not in profiling.MODES for m in modes) or ('CPROFILE' in modes and 'SAMPLE' in modes) \
+                or not options.get('profile-out', 'profile'):
+            sys.stderr.write(USAGE_STR + OPTIONS_USAGE_STR)
+            sys.exit(-1)
+        if 'SAMPLE' in modes and not profiling.sampling_available:
+            sys.stderr.write("--profile=SAMPLE needs setitimer / SIGPROF (unix)\n")
+            sys.exit(-1)
+        profiling.enable(modes, options.get('profile-out', 'profile'))
+
+    if ('checkpoint' in options) != ('checkpoint-at' in options) or not options.get('checkpoint-at', '0').isdigit() \
+            or not options.get('checkpoint', 'x') or not options.get('warm-start', 'x'):
+        sys.stderr.write(USAGE_STR + OPTIONS_USAGE_STR)
+        sys.exit(-1)
+    if 'checkpoint' in options:
+        checkpoint.at = int(options['checkpoint-at'])
+        checkpoint.out = options['checkpoint']
+    checkpoint.warm_start = options.get('warm-start')
+
+    if options.get('events', 'LOAD') not in ('LOAD', 'STREAM') or not options.get('event-window', '1').isdigit() \
+            or int(options.get('event-window', '1')) < 1:
+        sys.stderr.write(USAGE_STR + OPTIONS_USAGE_STR)
+        sys.exit(-1)
+    if options.get('events') == 'STREAM' and (checkpoint.at is not None or checkpoint.warm_start):
+        sys.stderr.write("--events=STREAM does not work with checkpoints\n")
+        sys.exit(-1)
+    event_stream.enabled = options.get('events') == 'STREAM'
+    event_stream.window = int(options.get('event-window', event_stream.WINDOW))
+
+
 def main():
-    if len(sys.argv) < 3 or len(sys.argv) > 4 or sys.argv[1] not in ROUTE_ALGORITHM:
-        sys.stderr.write(USAGE_STR)
+    options, argv = parse_args(sys.argv)
+
+    if len(argv) < 3 or len(argv) > 4 or argv[1] not in ROUTE_ALGORITHM:
+        sys.stderr.write(USAGE_STR + OPTIONS_USAGE_STR)
         sys.exit(-1)
 
     step = 'NO_STOP'
-    if len(sys.argv) == 4:
-        if sys.argv[3] not in STEP_COMMAND:
-            sys.stderr.write(USAGE_STR)
+    if len(argv) == 4:
+        if argv[3] not in STEP_COMMAND:
+            sys.stderr.write(USAGE_STR + OPTIONS_USAGE_STR)
             sys.exit(-1)
         else:
-            step = sys.argv[3]
+            step = argv[3]
+
+    configure(options)
 
-    s = Sim(sys.argv[1], sys.argv[2], step)
+    s = Sim(argv[1], argv[2], step)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,80 @@
+import heapq
+import itertools
+
+from simulator.topology import Get_Time
+
+# --------------------------------------------------------------------------------
+# END OF INSTANT CALLBACKS
+
+# the simulator itself never says "everything at this time has been
+# dispatched", Sim.dispatch_event does: once the next event is later than the
+# current time (or there is none left) it runs every callback registered here.
+# nodes use it to hold back what they send until the whole instant is over.
+
+# without a Sim driving the event queue there is no such point, so callbacks
+# just run as soon as they are registered
+# --------------------------------------------------------------------------------
+
+# set by Sim.dispatch_event while it owns the event loop
+driving = False
+
+end_of_instant = []
+
+
+def at_end_of_instant(callback):
+    if driving:
+        end_of_instant.append(callback)
+    else:
+        callback()
+
+
+def run_end_of_instant():
+    # callbacks may register more callbacks, keep going until none are left
+    while end_of_instant:
+        callbacks = end_of_instant[:]
+        del end_of_instant[:]
+        for callback in callbacks:
+            callback()
+
+
+# --------------------------------------------------------------------------------
+# TIMERS
+
+# callbacks to run later in simulated time. Sim.dispatch_event runs a timer
+# once every event up to and including its due time has been dispatched:
+# it moves the clock to the due time, runs the callback and then the end of
+# instant callbacks, before going on with the next event.
+
+# without a Sim driving there is no clock to move, timers go off right away
+# --------------------------------------------------------------------------------
+
+# heap of [due, order, callback], callback is None once cancelled
+timers = []
+order = itertools.count()
+
+
+def after(delay, callback):
+    # returns a handle for cancel, None if the callback has already run
+    if not driving:
+        callback()
+        return None
+    timer = [Get_Time() + delay, next(order), callback]
+    heapq.heappush(timers, timer)
+    return timer
+
+
+def cancel(timer):
+    timer[2] = None
+
+
+def next_due():
+    # due time of the next timer, None if there is none
+    while timers and timers[0][2] is None:
+        heapq.heappop(timers)
+    return timers[0][0] if timers else None
+
+
+def run_next():
+    # the clock must already be at next_due()
+    callback = heapq.heappop(timers)[2]
+    callback()
@@ -0,0 +1,214 @@
+import math
+import random
+import sys
+
+# --------------------------------------------------------------------------------
+# SYNTHETIC TOPOLOGIES
+
+# writes event files in the same format as testing_suite/case_*.event:
+# every node is added at time 0 and every link at time 1, then (optionally) a
+# churn schedule changes link costs and takes links down and back up, and the
+# file ends with DRAW_PATHs between random pairs of nodes. nodes are 0..n-1,
+# the same seed always gives the same file
+
+# with --areas=N the nodes are split into a backbone and N areas (in that
+# order, as even as they go), each one a KIND topology of its own. every area
+# is joined to the backbone by a few random links (--borders) and the file
+# puts the nodes in their areas with AREA lines (see sim.read_areas)
+# --------------------------------------------------------------------------------
+
+USAGE_STR = "Usage: python topology_gen.py KIND NODES OUTPUT_FILE\n" \
+            "KIND: RANDOM | GRID | RING | FAT_TREE | SCALE_FREE\n" \
+            "Options: --seed=N (default 0)\n" \
+            "         --degree=D (average degree of RANDOM, links per new node of SCALE_FREE, default 4 / 2)\n" \
+            "         --max-cost=C (link costs are 1..C, default 20)\n" \
+            "         --churn=N (link changes after the network is up, default 0)\n" \
+            "         --start=TIME (time of the first change, default 1000)\n" \
+            "         --interval=TIME (time between changes, default 1000)\n" \
+            "         --draws=N (DRAW_PATHs at the end, default 1)\n" \
+            "         --areas=N (split into a backbone and N areas, default 0: no areas)\n" \
+            "         --borders=N (links between each area and the backbone, default 2)\n"
+
+
+# LINK GENERATORS ----------------------------------------------------------------
+# each returns a list of (node1, node2) pairs over nodes 0..n-1, connected
+
+def ring_links(n, rand, degree):
+    return [(i, (i + 1) % n) for i in range(n)]
+
+
+def grid_links(n, rand, degree):
+    # rows of ceil(sqrt(n)) nodes, the last row may be short
+    cols = math.ceil(math.sqrt(n))
+    links = []
+    for i in range(n):
+        if (i + 1) % cols != 0 and i + 1 < n:
+            links.append((i, i + 1))
+        if i + cols < n:
+            links.append((i, i + cols))
+    return links
+
+
+def random_links(n, rand, degree):
+    # a random spanning tree, then random extra links up to the average degree
+    links = set()
+    for i in range(1, n):
+        links.add((rand.randrange(i), i))
+    wanted = min(n * degree // 2, n * (n - 1) // 2)
+    while len(links) < wanted:
+        a, b = rand.sample(range(n), 2)
+        if (b, a) not in links:
+            links.add((a, b))
+    return sorted(links)
+
+
+def scale_free_links(n, rand, degree):
+    # barabasi-albert: start from a clique of degree + 1 nodes, every new
+    # node links to degree distinct nodes picked in proportion to their degree
+    m = max(1, min(degree, n - 1))
+    links = [(a, b) for a in range(m + 1) for b in range(a + 1, m + 1)]
+    # every node appears here once per link it has
+    ends = [node for link in links for node in link]
+    for new in range(m + 1, n):
+        targets = set()
+        while len(targets) < m:
+            targets.add(rand.choice(ends))
+        for node in sorted(targets):
+            links.append((node, new))
+            ends += [node, new]
+    return links
+
+
+def fat_tree_links(n, rand, degree):
+    # k-ary fat tree (k/2)^2 core, k pods of k/2 aggregation + k/2 edge
+    # switches, the biggest k that fits in n nodes. whatever is left over
+    # are hosts, spread over the edge switches
+    k = 2
+    while 5 * (k + 2) ** 2 // 4 <= n:
+        k += 2
+    half = k // 2
+    core = list(range(half * half))
+    links = []
+    edges = []
+    next_id = len(core)
+    for pod in range(k):
+        aggregation = list(range(next_id, next_id + half))
+        edge = list(range(next_id + half, next_id + k))
+        next_id += k
+        for i, agg in enumerate(aggregation):
+            links += [(agg, c) for c in core[i * half:(i + 1) * half]]
+            links += [(agg, e) for e in edge]
+        edges += edge
+    for host in range(next_id, n):
+        links.append((edges[(host - next_id) % len(edges)], host))
+    return links
+
+
+KINDS = {
+    'RANDOM': random_links,
+    'GRID': grid_links,
+    'RING': ring_links,
+    'FAT_TREE': fat_tree_links,
+    'SCALE_FREE': scale_free_links,
+}
+
+# minimum node count of every kind
+MIN_NODES = {'RANDOM': 2, 'GRID': 2, 'RING': 3, 'FAT_TREE': 5, 'SCALE_FREE': 2}
+
+
+# EVENTS -------------------------------------------------------------------------
+
+def area_links(kind, n, rand, degree, areas, borders):
+    # ({area : range of its nodes}, links) of a backbone (area 0) and areas
+    # 1..areas, each a kind topology, joined by borders links per area
+    size, extra = divmod(n, areas + 1)
+    ranges = {}
+    first = 0
+    for area in range(areas + 1):
+        ranges[area] = range(first, first + size + (area < extra))
+        first = ranges[area].stop
+
+    links = []
+    for area, nodes in ranges.items():
+        links += [(nodes[a], nodes[b]) for a, b in KINDS[kind](len(nodes), rand, degree)]
+    for area in range(1, areas + 1):
+        joined = set()
+        while len(joined) < min(borders, len(ranges[0]) * len(ranges[area])):
+            joined.add((rand.choice(ranges[0]), rand.choice(ranges[area])))
+        links += sorted(joined)
+    return ranges, links
+
+
+def generate(kind, n, seed=0, degree=None, max_cost=20, churn=0, start=1000, interval=1000, draws=1, areas=0, borders=2):
+    # returns the lines of the event file
+    rand = random.Random(seed)
+    if degree is None:
+        degree = 2 if kind == 'SCALE_FREE' else 4
+    if areas:
+        ranges, links = area_links(kind, n, rand, degree, areas, borders)
+    else:
+        links = KINDS[kind](n, rand, degree)
+    costs = {link: rand.randint(1, max_cost) for link in links}
+
+    if areas:
+        lines = [f"# {kind} topology, {n} nodes, {len(links)} links, seed {seed}, {areas} areas"]
+        lines += [f"# AREA {area} {nodes.start}-{nodes.stop - 1}" for area, nodes in ranges.items()]
+        lines.append("")
+    else:
+        lines = [f"# {kind} topology, {n} nodes, {len(links)} links, seed {seed}", ""]
+    lines += [f"0 ADD_NODE {i}" for i in range(n)]
+    lines.append("")
+    lines += [f"1 ADD_LINK {a} {b} {costs[(a, b)]}" for a, b in links]
+
+    # churn: a cost change, or the link going down for half an interval
+    time = start
+    if churn:
+        lines.append("")
+    for _ in range(churn):
+        link = rand.choice(links)
+        if rand.random() < 0.5:
+            costs[link] = rand.randint(1, max_cost)
+            lines.append(f"{time} CHANGE_LINK {link[0]} {link[1]} {costs[link]}")
+        else:
+            lines.append(f"{time} DELETE_LINK {link[0]} {link[1]}")
+            lines.append(f"{time + interval // 2} ADD_LINK {link[0]} {link[1]} {costs[link]}")
+        time += interval
+
+    lines.append("")
+    for _ in range(draws):
+        src, dst = rand.sample(range(n), 2)
+        lines.append(f"{time} DRAW_PATH {src} {dst}")
+    return lines
+
+
+def main():
+    options = dict(a[2:].partition('=')[::2] for a in sys.argv[1:] if a.startswith('--'))
+    argv = [a for a in sys.argv if not a.startswith('--')]
+
+    if len(argv) != 4 or argv[1] not in KINDS or not argv[2].isdigit() or int(argv[2]) < MIN_NODES[argv[1]]:
+        sys.stderr.write(USAGE_STR)
+        sys.exit(-1)
+
+    names = {'seed': 'seed', 'degree': 'degree', 'max-cost': 'max_cost', 'churn': 'churn',
+             'start': 'start', 'interval': 'interval', 'draws': 'draws', 'areas': 'areas', 'borders': 'borders'}
+    kwargs = {}
+    for name, value in options.items():
+        if name not in names or not value.isdigit():
+            sys.stderr.write(USAGE_STR)
+            sys.exit(-1)
+        kwargs[names[name]] = int(value)
+    if kwargs.get('max_cost', 1) < 1:
+        sys.stderr.write(USAGE_STR)
+        sys.exit(-1)
+    # every area (and the backbone) has to be big enough for a kind topology
+    if int(argv[2]) // (kwargs.get('areas', 0) + 1) < MIN_NODES[argv[1]]:
+        sys.stderr.write(USAGE_STR)
+        sys.exit(-1)
+
+    lines = generate(argv[1], int(argv[2]), **kwargs)
+    with open(argv[3], 'w') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+if __name__ == '__main__':
+    main()
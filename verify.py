@@ -0,0 +1,316 @@
+import heapq
+import logging
+import math
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# --------------------------------------------------------------------------------
+# ROUTING TABLE VERIFICATION
+
+# after a run, checks what get_next_hop says on every node for every
+# destination against the final topology (replayed from the event file):
+
+# no_route            d is reachable but u has no next hop for it
+# route_to_unreachable  u has a next hop for a d it has no way to reach
+# not_a_link          u's next hop is not one of its neighbors
+# loop / black_hole   following next hops from u never gets to d: it goes
+#                     around in circles, or ends at a node with no route
+# not_shortest        the route works but costs more than the shortest path
+
+# that takes no all pairs shortest paths: following the next hops gives
+# route_cost[u][d], the cost of a real path, so it can only be too high. and it
+# is the shortest cost for every pair as soon as no link (u, v) offers a better
+# one, route_cost[u][d] <= cost(u, v) + route_cost[v][d] (add that up along
+# any path from u to d, no path comes out cheaper). with numpy the walks and
+# that check are a few gathers and broadcast compares per block of
+# destinations, so a 5000 node topology takes seconds on top of asking every
+# node for every next hop. without numpy the same checks run in plain python.
+
+# true distances are only worked out (dijkstra from the destination) to show
+# how far off a not_shortest route is.
+# --------------------------------------------------------------------------------
+
+USAGE_STR = "Usage: python verify.py ALGORITHM EVENT_FILE (plus any sim.py option)\n"
+
+KINDS = ('no_route', 'route_to_unreachable', 'not_a_link', 'loop', 'black_hole', 'not_shortest')
+
+# problems spelled out in the report, the rest are only counted
+SHOWN = 20
+
+# route cost of pairs without a working route (numpy)
+NO_COST = 1 << 60
+
+
+# TOPOLOGY -----------------------------------------------------------------------
+
+def final_topology(event_file):
+    # {node : {neighbor : cost}} once every event in the file has happened
+    events = []
+    for line in open(event_file):
+        fields = line.split()
+        if not fields or fields[0].startswith('#'):
+            continue
+        events.append((int(fields[0]), len(events), fields[1], [int(x) for x in fields[2:]]))
+    # the event queue runs events in time order, file order on ties
+    events.sort()
+
+    graph = {}
+    for time, order, operation, args in events:
+        if operation == 'ADD_NODE':
+            graph.setdefault(args[0], {})
+        elif operation in ('ADD_LINK', 'CHANGE_LINK'):
+            node1, node2, cost = args
+            graph.setdefault(node1, {})[node2] = cost
+            graph.setdefault(node2, {})[node1] = cost
+        elif operation in ('DELETE_LINK', 'REMOVE_LINK'):
+            node1, node2 = args
+            graph.get(node1, {}).pop(node2, None)
+            graph.get(node2, {}).pop(node1, None)
+        elif operation in ('DELETE_NODE', 'REMOVE_NODE'):
+            for neighbor in graph.pop(args[0], {}):
+                graph[neighbor].pop(args[0], None)
+    return graph
+
+
+def components(graph):
+    # {node : id of its connected component}
+    component = {}
+    for start in graph:
+        if start in component:
+            continue
+        component[start] = start
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for neighbor in graph[node]:
+                if neighbor not in component:
+                    component[neighbor] = start
+                    stack.append(neighbor)
+    return component
+
+
+def dijkstra(graph, source):
+    distances = {source: 0}
+    heap = [(0, source)]
+    while heap:
+        distance, node = heapq.heappop(heap)
+        if distance > distances[node]:
+            continue
+        for neighbor, cost in graph[node].items():
+            if distance + cost < distances.get(neighbor, math.inf):
+                distances[neighbor] = distance + cost
+                heapq.heappush(heap, (distance + cost, neighbor))
+    return distances
+
+
+# CHECKS -------------------------------------------------------------------------
+
+class Report:
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.counts = {kind: 0 for kind in KINDS}
+        self.problems = []
+        self.pairs = len(graph) * (len(graph) - 1)
+        # dijkstra results, for describing not_shortest routes
+        self.distances = {}
+
+    def add(self, kind, node, dst, cost=None):
+        self.counts[kind] += 1
+        if len(self.problems) >= SHOWN:
+            return
+        if kind == 'not_shortest':
+            if dst not in self.distances:
+                self.distances[dst] = dijkstra(self.graph, dst)
+            self.problems.append(f"{node} -> {dst}: not_shortest, costs {cost} instead of {self.distances[dst][node]}")
+        else:
+            self.problems.append(f"{node} -> {dst}: {kind}")
+
+    def to_json(self):
+        return {'pairs': self.pairs, 'ok': not any(self.counts.values()), 'counts': self.counts, 'problems': self.problems}
+
+
+class Positions(dict):
+    # {node : position in ids}, -2 for anything that is not a node
+    def __missing__(self, key):
+        return -2
+
+
+def next_hops(nodes, ids):
+    # hops[i][j] = position in ids of what node ids[i] says its next hop to
+    # ids[j] is, -1 for no route, -2 for something that is not a node. a
+    # node's hop to itself is never asked for, it is i
+    lookup = Positions((node, i) for i, node in enumerate(ids))
+    lookup[-1] = -1
+    hops = []
+    for i, node_id in enumerate(ids):
+        node = nodes.get(node_id)
+        if node is None:
+            row = [-1] * (len(ids) - 1)
+        else:
+            # n^2 calls in all, kept to the bare map
+            row = list(map(lookup.__getitem__, map(node.get_next_hop, ids[:i] + ids[i + 1:])))
+        row.insert(i, i)
+        hops.append(row)
+    return hops
+
+
+def check_python(report, ids, adjacency, labels, hops):
+    n = len(ids)
+    for j in range(n):
+        # cost of every working route to j, and what went wrong with the others
+        cost = {j: 0}
+        fate = {}
+        for i in range(n):
+            if i == j:
+                continue
+            hop = hops[i][j]
+            if labels[i] != labels[j]:
+                if hop != -1:
+                    report.add('route_to_unreachable', ids[i], ids[j])
+                fate[i] = None
+            elif hop == -1:
+                report.add('no_route', ids[i], ids[j])
+                fate[i] = 'black_hole'
+            elif hop not in adjacency[i]:
+                report.add('not_a_link', ids[i], ids[j])
+                fate[i] = 'black_hole'
+
+        for i in range(n):
+            if i in cost or i in fate:
+                continue
+            chain = []
+            on_chain = set()
+            node = i
+            while node not in cost and node not in fate and node not in on_chain:
+                chain.append(node)
+                on_chain.add(node)
+                node = hops[node][j]
+            if node in cost:
+                total = cost[node]
+                for node in reversed(chain):
+                    total += adjacency[node][hops[node][j]]
+                    cost[node] = total
+            else:
+                kind = 'loop' if node in on_chain else fate[node]
+                for node in chain:
+                    fate[node] = kind
+                    report.add(kind, ids[node], ids[j])
+
+        for i, total in cost.items():
+            if any(v in cost and total > link_cost + cost[v] for v, link_cost in adjacency[i].items()):
+                report.add('not_shortest', ids[i], ids[j], total)
+
+
+def check_numpy(report, ids, adjacency, labels, hops):
+    n = len(ids)
+    # routes[j, i] = position of ids[i]'s next hop to ids[j], destinations are
+    # rows so every gather below stays within one row
+    routes = numpy.array(hops, dtype=numpy.int64).reshape(n, n).T
+    labels = numpy.array(labels, dtype=numpy.int64)
+
+    # every link in both directions, and a sorted key -> cost lookup
+    sources = numpy.array([i for i in range(n) for v in adjacency[i]], dtype=numpy.int64)
+    targets = numpy.array([v for i in range(n) for v in adjacency[i]], dtype=numpy.int64)
+    link_costs = numpy.array([c for i in range(n) for c in adjacency[i].values()], dtype=numpy.int64)
+    keys = sources * n + targets
+    order = keys.argsort()
+    keys, key_costs = numpy.append(keys[order], -1), numpy.append(link_costs[order], 0)
+
+    nodes = numpy.arange(n)[None, :]
+    # enough doublings to follow a route through every node
+    rounds = max(1, n.bit_length())
+    block = max(1, min(n, 4000000 // max(1, len(sources), n)))
+    for start in range(0, n, block):
+        dsts = numpy.arange(start, min(n, start + block))[:, None]
+        hop = routes[start:start + block]
+        own = nodes == dsts
+        same = labels[None, :] == labels[dsts]
+
+        # one step: the link to the next hop
+        key = nodes * n + numpy.maximum(hop, 0)
+        found = numpy.minimum(numpy.searchsorted(keys[:-1], key), len(keys) - 1)
+        is_link = (hop >= 0) & (keys[found] == key) & ~own
+        step = numpy.where(is_link, key_costs[found], 0)
+
+        flagged = [('route_to_unreachable', ~same & (hop != -1) & ~own),
+                   ('no_route', same & (hop == -1)),
+                   ('not_a_link', same & (hop != -1) & ~is_link & ~own)]
+
+        # follow every route by pointer doubling: dead ends point at
+        # themselves at NO_COST, the destination at itself at no cost.
+        # pointers are flat indices into the block (numpy.take is the
+        # quickest gather there is)
+        dead = same & ~is_link & ~own
+        row_start = (dsts - start) * n
+        pointer = numpy.where(is_link & same, hop, nodes) + row_start
+        total = numpy.where(dead, NO_COST, step)
+        for _ in range(rounds):
+            total = numpy.minimum(total + numpy.take(total, pointer), NO_COST)
+            following = numpy.take(pointer, pointer)
+            if numpy.array_equal(following, pointer):
+                # everything is at its destination or a dead end
+                break
+            pointer = following
+        walking = same & is_link
+        arrived = pointer == row_start + dsts
+        ends_dead = numpy.take(dead, pointer)
+        flagged += [('loop', walking & ~arrived & ~ends_dead),
+                    ('black_hole', walking & ~arrived & ends_dead)]
+
+        # the certificate, over pairs with a working route on both ends
+        cost = numpy.where(own | (walking & arrived), total, NO_COST)
+        via = cost[:, targets]
+        worse = (cost[:, sources] > link_costs[None, :] + via) & (via < NO_COST)
+        not_shortest = numpy.zeros(cost.shape, dtype=bool)
+        row, link = worse.nonzero()
+        not_shortest[row, sources[link]] = True
+        flagged.append(('not_shortest', not_shortest & (cost < NO_COST)))
+
+        for kind, mask in flagged:
+            if mask.any():
+                for j, i in zip(*mask.nonzero()):
+                    report.add(kind, ids[i], ids[dsts[j, 0]], int(cost[j, i]))
+
+
+def verify(nodes, event_file):
+    # nodes : {node id : node} after the run, returns a Report.to_json()
+    graph = final_topology(event_file)
+    ids = sorted(graph)
+    position = {node: i for i, node in enumerate(ids)}
+    adjacency = [{position[v]: c for v, c in graph[u].items()} for u in ids]
+    component = components(graph)
+    labels = [position[component[u]] for u in ids]
+
+    report = Report(graph)
+    hops = next_hops(nodes, ids)
+    check = check_numpy if numpy is not None else check_python
+    check(report, ids, adjacency, labels, hops)
+    return report.to_json()
+
+
+def main():
+    import sim
+
+    options, argv = sim.parse_args(sys.argv)
+    if len(argv) != 3 or argv[1] not in ('DISTANCE_VECTOR', 'LINK_STATE'):
+        sys.stderr.write(USAGE_STR)
+        sys.exit(-1)
+    sim.configure(options)
+
+    logging.basicConfig(level=logging.WARNING)
+    s = sim.Sim(argv[1], argv[2])
+    report = verify(s.nodes, argv[2])
+    print(f"{report['pairs']} pairs checked: " + ", ".join(f"{kind} {n}" for kind, n in report['counts'].items()))
+    for problem in report['problems']:
+        print(problem)
+    if not report['ok']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()